@@ -1,3 +1,5 @@
+import argparse
+import os
 import osmnx as ox
 import geopandas as gpd
 from shapely.errors import TopologicalError
@@ -18,6 +20,17 @@ def precompute_and_save_data(north, south, east, west, road_path, industrial_pat
         print(f"❌ Could not download or save road data. Error: {e}")
 
     # 2️⃣ Download, clean, and save industrial area data
+    precompute_industrial_data(north, south, east, west, industrial_path)
+
+def precompute_industrial_data(north, south, east, west, industrial_path):
+    """
+    Downloads OSM industrial landuse for a bbox, cleans the geometries and saves
+    them as the GPKG layer behind the forecast's offline industrial index.
+
+    The layer is written to a temporary file and renamed into place, so a
+    running app never reads a half-written file.
+    """
+    bbox = (north, south, east, west)
     try:
         print(f"Downloading industrial landuse for bbox: {bbox}...")
         tags = {"landuse": "industrial"}
@@ -53,13 +66,18 @@ def precompute_and_save_data(north, south, east, west, road_path, industrial_pat
         if industrial_gdf.empty:
             print("⚠️ No valid industrial geometries remain after cleaning.")
             return
-        
+
         clean_gdf = gpd.GeoDataFrame({
             'geometry': industrial_gdf['geometry'],
             'landuse': 'industrial'
         }, crs=industrial_gdf.crs)
 
-        clean_gdf.to_file(industrial_path, driver='GPKG', layer='industrial')
+        # Write next to the destination, then swap it in atomically
+        tmp_path = f"{industrial_path}.tmp.gpkg"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        clean_gdf.to_file(tmp_path, driver='GPKG', layer='industrial')
+        os.replace(tmp_path, industrial_path)
         print(f"✅ Successfully cleaned and saved industrial data to {industrial_path}")
 
     except Exception as e:
@@ -67,10 +85,22 @@ def precompute_and_save_data(north, south, east, west, road_path, industrial_pat
 
 # ============================================
 # Example usage
+#   python -m MODEL.geolocation_data                    # roads + industrial
+#   python -m MODEL.geolocation_data --industrial-only  # refresh the industrial index
 # ============================================
 if __name__ == '__main__':
     NORTH, SOUTH, EAST, WEST = 55, 19, -46, -136
     ROADS_FILE = "./MODEL/geolocation/precomputed_roads.gpkg"
-    INDUSTRIAL_FILE = "./MODEL/geolocation/precomputed_industrial.gpkg"
-    precompute_and_save_data(NORTH, SOUTH, EAST, WEST, ROADS_FILE, INDUSTRIAL_FILE)
+    INDUSTRIAL_FILE = "./precomputed_industrial.gpkg"
+
+    arg_parser = argparse.ArgumentParser(description="Pre-compute the offline road and industrial layers.")
+    arg_parser.add_argument("--industrial-only", action="store_true",
+                            help="Only rebuild the industrial layer used by the forecast.")
+    arg_parser.add_argument("--industrial-path", default=INDUSTRIAL_FILE)
+    args = arg_parser.parse_args()
+
+    if args.industrial_only:
+        precompute_industrial_data(NORTH, SOUTH, EAST, WEST, args.industrial_path)
+    else:
+        precompute_and_save_data(NORTH, SOUTH, EAST, WEST, ROADS_FILE, args.industrial_path)
     print("\nPre-computation complete.")
@@ -0,0 +1,103 @@
+import os
+import pickle
+import threading
+import time
+import joblib
+
+# --- Registry Configuration ---
+MODEL_DIR = "./MODEL"
+POLLUTANTS = ("pm25", "no2", "o3", "hcho")
+
+# Process-wide registry: pollutant key -> loaded model, scaler and load stats.
+# Entries are written once under the lock and treated as read-only afterwards,
+# so every request thread can share the same objects.
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_model_paths(pollutant):
+    """Returns the (model, scaler) joblib paths for a pollutant key."""
+    return (
+        os.path.join(MODEL_DIR, f"{pollutant}_model.joblib"),
+        os.path.join(MODEL_DIR, f"{pollutant}_scalar.joblib"),
+    )
+
+
+def _estimate_size(obj):
+    """Approximates the in-memory size of a loaded object by its pickled size."""
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None
+
+
+def _load_entry(pollutant):
+    """Deserializes the model and scaler for one pollutant and records stats."""
+    model_path, scaler_path = get_model_paths(pollutant)
+    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
+        raise FileNotFoundError(
+            f"Model or scaler file not found for '{pollutant}':\n- {model_path}\n- {scaler_path}"
+        )
+
+    start = time.perf_counter()
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path)
+    load_seconds = time.perf_counter() - start
+
+    model_bytes = _estimate_size(model)
+    scaler_bytes = _estimate_size(scaler)
+    print(f"✅ Loaded '{pollutant}' model and scaler in {load_seconds:.3f}s.")
+    return {
+        "model": model,
+        "scaler": scaler,
+        "model_path": model_path,
+        "scaler_path": scaler_path,
+        "load_seconds": round(load_seconds, 4),
+        "model_bytes": model_bytes,
+        "scaler_bytes": scaler_bytes,
+        "loaded_at": time.time(),
+    }
+
+
+def get_model(pollutant):
+    """
+    Returns the shared (model, scaler) pair for a pollutant, loading it on first use.
+
+    Args:
+        pollutant (str): One of POLLUTANTS, e.g. 'no2'.
+
+    Returns:
+        tuple: The loaded model and scaler. Callers must not mutate them.
+    """
+    pollutant = pollutant.lower()
+    if pollutant not in POLLUTANTS:
+        raise KeyError(f"Unknown pollutant '{pollutant}'. Expected one of {POLLUTANTS}.")
+
+    entry = _registry.get(pollutant)
+    if entry is None:
+        with _registry_lock:
+            # Another thread may have finished loading while we waited.
+            entry = _registry.get(pollutant)
+            if entry is None:
+                entry = _load_entry(pollutant)
+                _registry[pollutant] = entry
+    return entry["model"], entry["scaler"]
+
+
+def preload_models(pollutants=POLLUTANTS):
+    """Loads every model up front so the first request does not pay for it."""
+    for pollutant in pollutants:
+        try:
+            get_model(pollutant)
+        except Exception as e:
+            print(f"❌ Could not preload model for '{pollutant}': {e}")
+
+
+def get_registry_stats():
+    """Returns load time and approximate memory size for each loaded model."""
+    stats = {}
+    for pollutant, entry in _registry.items():
+        stats[pollutant] = {
+            key: value for key, value in entry.items() if key not in ("model", "scaler")
+        }
+    return stats
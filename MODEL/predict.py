@@ -13,6 +13,13 @@ def lat_lon_to_cartesian(lat, lon):
     z = np.sin(lat_rad)
     return x, y, z
 
+# The feature order is identical to the one used for training.
+# This is a critical step!
+FEATURES_IN_ORDER = [
+    'industrial', 'road', 'population', 'elev', 'prectot', 'rh', 
+    'temp', 'x', 'y', 'z'
+]
+
 # --- CORE PREDICTION FUNCTION ---
 def predict_single_instance(input_data, model, scaler):
     """
@@ -45,14 +52,8 @@ def predict_single_instance(input_data, model, scaler):
     input_df['x'], input_df['y'], input_df['z'] = lat_lon_to_cartesian(input_df['lat'], input_df['lon'])
     
     # 4. Ensure the feature order is identical to the one used for training
-    # This is a critical step!
-    features_in_order = [
-        'industrial', 'road', 'population', 'elev', 'prectot', 'rh', 
-        'temp', 'x', 'y', 'z'
-    ]
-    
     # Reorder DataFrame columns to match the model's expectation
-    X = input_df[features_in_order]
+    X = input_df[FEATURES_IN_ORDER]
     print("\nData after Feature Engineering (Ready for Scaling):")
     print(X.to_string(index=False))
 
@@ -66,6 +67,41 @@ def predict_single_instance(input_data, model, scaler):
     # The model outputs a numpy array, so we extract the single value
     return round(float(prediction[0]), 2)
 
+# --- BATCHED PREDICTION FUNCTION ---
+def predict_batch(input_records, model, scaler):
+    """
+    Predicts many data instances with a single scaler.transform and a single
+    model.predict call. Rows may cover several days, several locations or both.
+
+    Each returned value is identical to calling predict_single_instance on the
+    same record, since the feature engineering and rounding are unchanged.
+
+    Args:
+        input_records (list[dict] | pd.DataFrame): Records with all required input features.
+        model: The loaded XGBoost model.
+        scaler: The loaded StandardScaler.
+
+    Returns:
+        list[float]: The predicted values, in the same order as input_records.
+    """
+    if len(input_records) == 0:
+        return []
+
+    # 1. Build one feature matrix for every record
+    input_df = pd.DataFrame(input_records)
+
+    # 2. Vectorized feature engineering over the whole frame
+    input_df['x'], input_df['y'], input_df['z'] = lat_lon_to_cartesian(
+        input_df['lat'].to_numpy(dtype=float), input_df['lon'].to_numpy(dtype=float)
+    )
+    X = input_df[FEATURES_IN_ORDER]
+
+    # 3. One transform and one predict for the whole batch
+    X_scaled = scaler.transform(X)
+    predictions = model.predict(X_scaled)
+
+    return [round(float(value), 2) for value in predictions]
+
 # # --- MAIN EXECUTION BLOCK ---
 # if __name__ == '__main__':
 #     # Define the paths to your saved model and scaler
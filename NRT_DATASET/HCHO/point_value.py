@@ -1,11 +1,15 @@
 # point_value_extractor.py
 
 import pandas as pd
-import xarray as xr
 import numpy as np
 import os
 from datetime import datetime, timedelta
 import pytz
+from NRT_DATASET.granule_store import get_granules, select_granules, PRODUCTS
+from NRT_DATASET.point_extractor import extract_value
+from NRT_DATASET.granule_catalog import catalog_path
+
+PRODUCT_CONFIG = PRODUCTS['HCHO']
 
 def get_point_value(da, qc_da, lat, lon, time=None, interp_method="linear"):
     """
@@ -137,53 +141,54 @@ def get_hcho_value(latitude: float, longitude: float, data_dir: str = "./NRT_DAT
     Args:
         latitude (float): The latitude of the point of interest.
         longitude (float): The longitude of the point of interest.
-        data_dir (str): The directory containing the 'granule_log.csv'.
+        data_dir (str): The directory containing the granule catalog.
 
     Returns:
         float: The NO2 value, or None if not found in the top 3 granules.
     """
-    log_file = os.path.join(data_dir, "granule_log.csv")
-    try:
-        log_df = pd.read_csv(log_file)
-        if log_df.empty:
-            print("Log file is empty. Please run data_fetcher.py first.")
-            return None
-    except FileNotFoundError:
-        print(f"Error: Log file not found at '{log_file}'. Run data_fetcher.py.")
+    catalog_file = catalog_path(data_dir)
+    # Granule arrays are held in memory and only reloaded when the catalog changes
+    granules = get_granules('HCHO', data_dir)
+    if granules is None:
+        print(f"Error: Granule catalog not found at '{catalog_file}'. Run data_fetcher.py.")
+        return None
+    if not granules:
+        print("Granule catalog is empty. Please run data_fetcher.py first.")
         return None
 
-    # Iterate through the top 3 files from the log
-    for index, row in log_df.head(3).iterrows():
+    # The composite names the freshest granule with a good pixel here, so this
+    # loop normally runs once; without a composite it tries the top 3 in order
+    granules = select_granules('HCHO', latitude, longitude, data_dir)
+    for row in granules:
         file_path = row['local_filepath']
         print(f"\nAttempting to extract value from: {os.path.basename(file_path)}")
 
         try:
-            with xr.open_datatree(file_path) as datatree:
-                data_array = datatree['product/vertical_column']
-                quality_flags = datatree["product/main_data_quality_flag"]
-                
-                value = get_point_value(data_array, quality_flags, lat=latitude, lon=longitude)
+            if row['error'] is not None:
+                raise row['error']
+            # Same rule as get_point_value, on the granule's prepared arrays
+            value = extract_value(row['grid'], latitude, longitude, PRODUCT_CONFIG['rule'], PRODUCT_CONFIG['scale'])
+            
+            if value is not None and not np.isnan(value) and value > 0:
+                # ==================== MODIFIED LOGIC HERE ====================
+                # Now that we have a valid value, check the timestamp of THIS file.
+                end_time_str = row['end_time']
+                granule_end_time = pd.to_datetime(end_time_str).tz_convert('UTC')
+                current_utc_time = datetime.now(pytz.utc)
+
+                # If this specific granule's data is older than 2 hours, discard it and continue.
+                if (current_utc_time - granule_end_time) > timedelta(hours=2):
+                    print(f"-> Value found, but data is from {granule_end_time.strftime('%H:%M:%S UTC')} (>2 hours old). Trying next file.")
+                    value, unit = get_latest_formaldehyde_data(latitude, longitude)
+                    return value, 'Open-Meteo', unit
                 
-                if value is not None and not np.isnan(value) and value > 0:
-                    # ==================== MODIFIED LOGIC HERE ====================
-                    # Now that we have a valid value, check the timestamp of THIS file.
-                    end_time_str = row['end_time']
-                    granule_end_time = pd.to_datetime(end_time_str).tz_convert('UTC')
-                    current_utc_time = datetime.now(pytz.utc)
-
-                    # If this specific granule's data is older than 2 hours, discard it and continue.
-                    if (current_utc_time - granule_end_time) > timedelta(hours=2):
-                        print(f"-> Value found, but data is from {granule_end_time.strftime('%H:%M:%S UTC')} (>2 hours old). Trying next file.")
-                        value, unit = get_latest_formaldehyde_data(latitude, longitude)
-                        return value, 'Open-Meteo', unit
-                    
-                    # If the value is valid AND the data is recent, it's a success.
-                    print(f"✓ Success! Found valid, recent data point: {value} (mol/m^2 * 1e15)")
-                    return value, 'Tempo', ' x 10¹⁶ molec/cm²'
-                    # ===========================================================
-
-                else:
-                    print(f"-> Value was 'nan' or negative - {value}. Trying next available file...")
+                # If the value is valid AND the data is recent, it's a success.
+                print(f"✓ Success! Found valid, recent data point: {value} (mol/m^2 * 1e15)")
+                return value, 'Tempo', ' x 10¹⁶ molec/cm²'
+                # ===========================================================
+
+            else:
+                print(f"-> Value was 'nan' or negative - {value}. Trying next available file...")
 
         except Exception as e:
             print(f"-> Could not process file {os.path.basename(file_path)}. Error: {e}")
@@ -0,0 +1,102 @@
+"""
+Benchmarks TEMPO point lookups: the xarray-based get_point_value against the
+numpy extractor with binary-search and arithmetic (regular grid) indexing, and
+with the precomputed neighbourhood decision.
+
+Usage:
+    python -m NRT_DATASET.benchmark_point_lookup
+    python -m NRT_DATASET.benchmark_point_lookup --granule path/to/TEMPO_NO2_L3.nc --points 500
+"""
+import argparse
+import io
+import time
+import contextlib
+import numpy as np
+import xarray as xr
+
+from NRT_DATASET.point_extractor import prepare_grid, extract_points, extract_value, neighbourhood_fields, RULE_QC_MASKED
+from NRT_DATASET.NO2.point_value import get_point_value
+
+# TEMPO L3 grid: 0.02° over 17-63°N, 169-13°W
+TEMPO_L3_LAT = (17.01, 62.99, 2300)
+TEMPO_L3_LON = (-168.99, -13.01, 7800)
+
+
+def make_synthetic_granule(seed=0):
+    """Builds a TEMPO-L3-sized NO2 granule with random values, gaps and QC flags."""
+    rng = np.random.default_rng(seed)
+    lat = np.linspace(*TEMPO_L3_LAT)
+    lon = np.linspace(*TEMPO_L3_LON)
+    shape = (1, lat.size, lon.size)
+    values = (3e15 * (1 + 0.1 * rng.standard_normal(shape, dtype=np.float32))).astype(np.float32)
+    values[rng.random(shape) < 0.05] = np.nan
+    qc = rng.choice(np.array([0, 0, 0, 0, 1, 2], dtype=np.int8), size=shape)
+    coords = {'time': [np.datetime64('2025-01-01T18:00')], 'latitude': lat, 'longitude': lon}
+    da = xr.DataArray(values, dims=('time', 'latitude', 'longitude'), coords=coords)
+    qc_da = xr.DataArray(qc, dims=da.dims, coords=coords)
+    return da, qc_da
+
+
+def load_granule(path):
+    with xr.open_datatree(path) as datatree:
+        da = datatree['product/vertical_column_troposphere'].load()
+        qc_da = datatree['product/main_data_quality_flag'].load()
+    return da, qc_da
+
+
+def _time_per_point(func, lats, lons):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [func(lat, lon) for lat, lon in zip(lats, lons)]
+    return (time.perf_counter() - start) / len(lats), results
+
+
+def run_benchmark(da, qc_da, n_points, seed=0):
+    rng = np.random.default_rng(seed)
+    lat_axis = np.asarray(da['latitude'].values)
+    lon_axis = np.asarray(da['longitude'].values)
+    lats = rng.uniform(lat_axis.min(), lat_axis.max(), n_points)
+    lons = rng.uniform(lon_axis.min(), lon_axis.max(), n_points)
+
+    grid = prepare_grid(da, qc_da)
+    binary_grid = dict(grid, lat_step=None, lon_step=None)
+    start = time.perf_counter()
+    lookup_grid = dict(grid, **neighbourhood_fields(grid['values'], grid['qc']))
+    print(f"Neighbourhood fields computed in {time.perf_counter() - start:.1f} s")
+    print(f"Grid {grid['values'].shape}, regular axes: lat={grid['lat_step'] is not None}, "
+          f"lon={grid['lon_step'] is not None}")
+
+    xarray_t, xarray_vals = _time_per_point(lambda a, b: get_point_value(da, qc_da, a, b), lats, lons)
+    binary_t, _ = _time_per_point(lambda a, b: extract_value(binary_grid, a, b, RULE_QC_MASKED, 10**16), lats, lons)
+    arith_t, arith_vals = _time_per_point(lambda a, b: extract_value(grid, a, b, RULE_QC_MASKED, 10**16), lats, lons)
+    lookup_t, lookup_vals = _time_per_point(lambda a, b: extract_value(lookup_grid, a, b, RULE_QC_MASKED, 10**16), lats, lons)
+
+    start = time.perf_counter()
+    extract_points(lookup_grid, lats, lons, RULE_QC_MASKED)
+    batch_t = (time.perf_counter() - start) / n_points
+
+    mismatches = sum(
+        1 for old, new, looked_up in zip(xarray_vals, arith_vals, lookup_vals)
+        for value in (new, looked_up)
+        if not (old == value or (old == 'nan' and np.isnan(value)) or (np.isnan(value) and np.isnan(old)))
+    )
+    print(f"{'path':<36}{'us/point':>12}{'speedup':>10}")
+    for label, t in [
+        ("get_point_value (xarray)", xarray_t),
+        ("extractor, binary search", binary_t),
+        ("extractor, arithmetic index", arith_t),
+        ("extractor, precomputed decision", lookup_t),
+        (f"extractor, batch of {n_points}", batch_t),
+    ]:
+        print(f"{label:<36}{t * 1e6:>12.1f}{xarray_t / t:>9.1f}x")
+    print(f"Value mismatches vs get_point_value: {mismatches}/{2 * n_points}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark TEMPO point lookups.")
+    parser.add_argument("--granule", help="TEMPO NO2 L3 NetCDF file (default: synthetic TEMPO-sized grid)")
+    parser.add_argument("--points", type=int, default=200, help="Number of random points")
+    args = parser.parse_args()
+
+    data_array, qc_array = load_granule(args.granule) if args.granule else make_synthetic_granule()
+    run_benchmark(data_array, qc_array, args.points)
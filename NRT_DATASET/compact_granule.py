@@ -0,0 +1,232 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from NRT_DATASET.point_extractor import prepare_grid, axis_step, neighbourhood_fields, RULE_QC_MASKED
+
+# --- Compact Store Configuration ---
+# Crop box "north,south,east,west" in degrees; unset keeps the full TEMPO field of regard
+TEMPO_CROP_BBOX = os.environ.get("TEMPO_CROP_BBOX")
+COMPACT_SUFFIX = ".compact"
+COMPOSITE_DIRNAME = "composite" # Best-valid-pixel composite inside each product's data_dir
+TIME_CUBE_DIRNAME = "time_cube" # Rolling stack of the latest scans inside each product's data_dir
+# Extra pixels kept around the crop box so neighbourhoods and interpolation at
+# its edge see the same pixels as in the full granule
+CROP_MARGIN_PIXELS = 2
+QC_FILL_VALUE = 255
+
+
+def parse_bbox(text):
+    """Parses 'north,south,east,west' into a tuple of floats, or None if unset."""
+    if not text:
+        return None
+    north, south, east, west = (float(v) for v in text.split(","))
+    return north, south, east, west
+
+
+def compact_path_for(nc_path):
+    return os.path.splitext(nc_path)[0] + COMPACT_SUFFIX
+
+
+def is_compact(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+
+def swap_directory(tmp_dir, out_dir):
+    """
+    Moves a freshly written directory into place. The current one is renamed
+    aside first and only deleted afterwards, so it is never lost: readers
+    find it through current_directory while the swap runs, and after a crash
+    in between it is still there as <out_dir>.old.
+    """
+    old_dir = out_dir + ".old"
+    if os.path.exists(out_dir):
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def current_directory(path):
+    """The directory at path, or its previous version while swap_directory replaces it."""
+    if not os.path.exists(path) and os.path.exists(path + ".old"):
+        return path + ".old"
+    return path
+
+
+def _crop_slice(axis, low, high):
+    """Index slice of an ascending axis covering [low, high] plus the margin."""
+    start = max(int(np.searchsorted(axis, low, side="left")) - CROP_MARGIN_PIXELS, 0)
+    stop = min(int(np.searchsorted(axis, high, side="right")) + CROP_MARGIN_PIXELS, axis.size)
+    return slice(start, stop)
+
+
+def convert_granule(nc_path, data_var, qc_var=None, rule=RULE_QC_MASKED,
+                    bbox=parse_bbox(TEMPO_CROP_BBOX), remove_source=True):
+    """
+    Converts a downloaded TEMPO granule into a directory of .npy arrays that
+    can be memory-mapped: data.npy (float32), qc.npy (uint8), lat.npy, lon.npy,
+    the neighbourhood fields (n_valid, rel_std, good_fraction, interp) and
+    meta.json. Only the first time slice of the variables we use is kept, on
+    ascending lat/lon axes and cropped to bbox.
+
+    The directory is written under a temporary name and renamed into place,
+    so readers never see a partial conversion.
+
+    Args:
+        nc_path (str): The downloaded NetCDF file.
+        data_var (str): Group path of the data variable (e.g. 'product/vertical_column').
+        qc_var (str): Group path of the quality flag variable, or None.
+        rule (str): The product's point extraction rule (see point_extractor).
+        bbox (tuple): (north, south, east, west) crop box, or None for the full grid.
+        remove_source (bool): Delete the NetCDF file after a successful conversion.
+
+    Returns:
+        str: Path of the compact granule directory.
+    """
+    with xr.open_datatree(nc_path) as datatree:
+        data = datatree[data_var].load()
+        qc = datatree[qc_var].load() if qc_var is not None else None
+    grid = prepare_grid(data, qc, rule)
+
+    lat_slice, lon_slice = slice(None), slice(None)
+    if bbox is not None:
+        north, south, east, west = bbox
+        lat_slice = _crop_slice(grid['lat'], south, north)
+        lon_slice = _crop_slice(grid['lon'], west, east)
+
+    out_dir = compact_path_for(nc_path)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    values = np.ascontiguousarray(grid['values'][lat_slice, lon_slice], dtype=np.float32)
+    np.save(os.path.join(tmp_dir, "data.npy"), values)
+    qc_values = None
+    if grid['qc'] is not None:
+        qc_values = grid['qc'][lat_slice, lon_slice]
+        if np.issubdtype(qc_values.dtype, np.floating):
+            # Fill values decode to NaN; keep them matching neither 0 (good) nor 2 (bad)
+            qc_values = np.where(np.isfinite(qc_values), qc_values, QC_FILL_VALUE)
+        qc_values = np.ascontiguousarray(qc_values, dtype=np.uint8)
+        np.save(os.path.join(tmp_dir, "qc.npy"), qc_values)
+
+    # 3x3 neighbourhood statistics, so the interp decision is a lookup at request time
+    for name, field in neighbourhood_fields(values, qc_values, rule).items():
+        if field is not None:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), field)
+    np.save(os.path.join(tmp_dir, "lat.npy"), grid['lat'][lat_slice])
+    np.save(os.path.join(tmp_dir, "lon.npy"), grid['lon'][lon_slice])
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({
+            'source': os.path.basename(nc_path),
+            'data_var': data_var,
+            'qc_var': qc_var,
+            'bbox': bbox,
+            'shape': list(values.shape),
+            'exact_nodes': grid['exact_nodes'],
+        }, f)
+
+    swap_directory(tmp_dir, out_dir)
+    if remove_source:
+        os.remove(nc_path)
+    return out_dir
+
+
+def load_compact_grid(path):
+    """
+    Opens a compact granule as a point_extractor grid. The data, QC and
+    neighbourhood arrays are memory-mapped read-only, so every process shares
+    the same pages. Fields missing from older conversions come back as None.
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    lat = np.load(os.path.join(path, "lat.npy"))
+    lon = np.load(os.path.join(path, "lon.npy"))
+    grid = {
+        'values': np.load(os.path.join(path, "data.npy"), mmap_mode="r"),
+        'lat': lat,
+        'lon': lon,
+        'lat_step': axis_step(lat),
+        'lon_step': axis_step(lon),
+        'exact_nodes': meta['exact_nodes'],
+    }
+    for name in ('qc', 'n_valid', 'rel_std', 'good_fraction', 'interp'):
+        field_file = os.path.join(path, f"{name}.npy")
+        grid[name] = np.load(field_file, mmap_mode="r") if os.path.exists(field_file) else None
+    return grid
+
+
+def load_composite(data_dir):
+    """
+    Opens a product's best-valid-pixel composite (see NRT_DATASET/composite.py).
+
+    Returns:
+        dict | None: 'value' and 'source' arrays (memory-mapped), 'lat', 'lon',
+                     their steps, and 'granules' (the source granules, in the
+                     order 'source' indexes them), or None if there is none.
+    """
+    path = current_directory(os.path.join(data_dir, COMPOSITE_DIRNAME))
+    if not is_compact(path):
+        return None
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    lat = np.load(os.path.join(path, "lat.npy"))
+    lon = np.load(os.path.join(path, "lon.npy"))
+    return {
+        'value': np.load(os.path.join(path, "value.npy"), mmap_mode="r"),
+        'source': np.load(os.path.join(path, "source.npy"), mmap_mode="r"),
+        'lat': lat,
+        'lon': lon,
+        'lat_step': axis_step(lat),
+        'lon_step': axis_step(lon),
+        'granules': meta['granules'],
+    }
+
+
+def load_time_cube(data_dir):
+    """
+    Opens a product's rolling time cube (see NRT_DATASET/time_cube.py).
+
+    Returns:
+        dict | None: 'values' (time, lat, lon, memory-mapped, oldest scan
+                     first), 'time' (scan mid-times as UTC datetime64), 'lat',
+                     'lon', their steps, and 'granules' (the scans' granule
+                     IDs and times), or None if there is none.
+    """
+    path = current_directory(os.path.join(data_dir, TIME_CUBE_DIRNAME))
+    if not is_compact(path):
+        return None
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    lat = np.load(os.path.join(path, "lat.npy"))
+    lon = np.load(os.path.join(path, "lon.npy"))
+    start = pd.to_datetime([g['start_time'] for g in meta['granules']], utc=True, format='ISO8601')
+    end = pd.to_datetime([g['end_time'] for g in meta['granules']], utc=True, format='ISO8601')
+    return {
+        'values': np.load(os.path.join(path, "values.npy"), mmap_mode="r"),
+        'time': (start + (end - start) / 2).tz_localize(None).values.astype('datetime64[s]'),
+        'lat': lat,
+        'lon': lon,
+        'lat_step': axis_step(lat),
+        'lon_step': axis_step(lon),
+        'granules': meta['granules'],
+    }
+
+
+def remove_granule_files(path):
+    """Deletes a granule from disk, whether it is a NetCDF file or a compact directory."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def granule_size(path):
+    """Bytes a granule takes on disk, whether it is a NetCDF file or a compact directory."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
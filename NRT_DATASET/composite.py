@@ -0,0 +1,101 @@
+import os
+import json
+import shutil
+import numpy as np
+
+from NRT_DATASET.granule_store import PRODUCTS, load_grid, normalize_path
+from NRT_DATASET.compact_granule import COMPOSITE_DIRNAME, granule_size, swap_directory
+from NRT_DATASET.point_extractor import RULE_QC_MASKED
+
+
+def good_pixel_mask(grid, config):
+    """
+    Pixels that can give a value on their own: finite, positive once scaled and
+    rounded like get_point_value, and (for the QC-masked rule) not flagged bad.
+    """
+    values = np.asarray(grid['values'], dtype=float)
+    with np.errstate(invalid="ignore"):
+        good = np.isfinite(values) & (np.round(values / config['scale'], 2) > 0)
+    if config['rule'] == RULE_QC_MASKED and grid['qc'] is not None:
+        good &= np.asarray(grid['qc']) != 2
+    return good
+
+
+def _same_grid(a, b):
+    return (a['values'].shape == b['values'].shape
+            and np.allclose(a['lat'], b['lat']) and np.allclose(a['lon'], b['lon']))
+
+
+def granule_summary(path, config):
+    """
+    Catalog summary of a stored granule: the bounding box of its grid, its
+    size on disk and how many of its pixels the composite would accept.
+    """
+    grid = load_grid(normalize_path(path), config)[2]
+    good = good_pixel_mask(grid, config)
+    return {
+        'south': float(grid['lat'][0]),
+        'north': float(grid['lat'][-1]),
+        'west': float(grid['lon'][0]),
+        'east': float(grid['lon'][-1]),
+        'size_bytes': granule_size(normalize_path(path)),
+        'valid_pixels': int(good.sum()),
+        'total_pixels': int(good.size),
+    }
+
+
+def build_composite(product, log_df, data_dir=None):
+    """
+    Builds the best-valid-pixel composite for a product's granules: for every
+    pixel, the value of the freshest granule with a good pixel there and the
+    index of that granule. Call it before committing the granules to the
+    catalog, so the store never sees them without their matching composite.
+
+    Args:
+        product (str): One of PRODUCTS ('NO2', 'HCHO', 'O3').
+        log_df (pd.DataFrame): The new catalog rows, newest granule first.
+        data_dir (str): The product's data directory. Defaults to the product's.
+
+    Returns:
+        str | None: Path of the composite directory, or None if the granules
+                    do not share one grid.
+    """
+    config = PRODUCTS[product]
+    data_dir = data_dir or config['data_dir']
+    rows = [row for _, row in log_df.head(config['max_granules']).iterrows()]
+    if not rows:
+        return None
+
+    grids = [load_grid(normalize_path(row['local_filepath']), config)[2] for row in rows]
+    if not all(_same_grid(grids[0], grid) for grid in grids[1:]):
+        print(f"Warning: {product} granules are on different grids; skipping the composite.")
+        return None
+
+    shape = grids[0]['values'].shape
+    value = np.full(shape, np.nan, dtype=np.float32)
+    source = np.full(shape, -1, dtype=np.int8)
+    for k, grid in enumerate(grids):
+        take = good_pixel_mask(grid, config) & (source < 0)
+        value[take] = np.asarray(grid['values'])[take]
+        source[take] = k
+
+    out_dir = os.path.join(data_dir, COMPOSITE_DIRNAME)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "value.npy"), value)
+    np.save(os.path.join(tmp_dir, "source.npy"), source)
+    np.save(os.path.join(tmp_dir, "lat.npy"), grids[0]['lat'])
+    np.save(os.path.join(tmp_dir, "lon.npy"), grids[0]['lon'])
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({
+            'product': product,
+            'granules': [
+                {'granule_id': row['granule_id'], 'start_time': str(row['start_time']), 'end_time': str(row['end_time'])}
+                for row in rows
+            ],
+        }, f)
+
+    swap_directory(tmp_dir, out_dir)
+    print(f"Built {product} composite: {int(np.sum(source >= 0))} of {source.size} pixels filled.")
+    return out_dir
@@ -0,0 +1,116 @@
+import os
+import threading
+import datetime as dt
+from harmony import Client, Collection, Environment
+import earthaccess
+from dotenv import load_dotenv
+
+# --- Session Configuration ---
+# Renew the Earthdata token this long before it expires
+TOKEN_RENEW_MARGIN = dt.timedelta(hours=float(os.environ.get("EARTHDATA_TOKEN_RENEW_MARGIN_HOURS", "6")))
+# Tokens whose expiry cannot be read are renewed after this long
+TOKEN_MAX_AGE = dt.timedelta(hours=float(os.environ.get("EARTHDATA_TOKEN_MAX_AGE_HOURS", "24")))
+# Harmony deployment: PROD, UAT, SIT, or LOCAL for a stand-in at localhost:3000
+HARMONY_ENV = os.environ.get("HARMONY_ENV", "PROD")
+
+
+def _token_expiry(auth):
+    """Reads the expiry of an earthaccess login's token, or None if it has none."""
+    token = getattr(auth, 'token', None) or {}
+    expiration = token.get('expiration_date') if isinstance(token, dict) else None
+    if not expiration:
+        return None
+    for fmt in ("%m/%d/%Y", "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%d"):
+        try:
+            return dt.datetime.strptime(expiration, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class EarthdataSession:
+    """
+    A long-lived NASA Earthdata login and Harmony client shared by every
+    ingest cycle.
+
+    The login is only repeated when its token is about to expire, the Harmony
+    client (and the HTTP connections it holds) is only rebuilt after a new
+    login, and collection metadata is fetched once per collection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._auth = None
+        self._renew_at = None
+        self._client = None
+        self._collections = {}
+        self._collection_metadata = {}
+
+    def _needs_login(self, now):
+        return self._auth is None or not getattr(self._auth, 'authenticated', True) or now >= self._renew_at
+
+    def _login(self, now):
+        load_dotenv()
+        print("Authenticating with NASA Earthdata...")
+        auth = earthaccess.login(strategy="environment")
+        if not auth:
+            print("Earthdata login failed. Please check your .env file.")
+            return False
+
+        expiry = _token_expiry(auth)
+        self._auth = auth
+        self._renew_at = expiry - TOKEN_RENEW_MARGIN if expiry else now + TOKEN_MAX_AGE
+        self._client = Client(
+            auth=(os.getenv("EARTHDATA_USERNAME"), os.getenv("EARTHDATA_PASSWORD")),
+            env=Environment[HARMONY_ENV.upper()],
+        )
+        print(f"Earthdata session valid until {self._renew_at:%Y-%m-%d %H:%M}.")
+        return True
+
+    def harmony_client(self):
+        """
+        Returns the shared Harmony client, logging in (again) first if there is
+        no session yet or its token is about to expire.
+
+        Returns:
+            Client | None: The Harmony client, or None if the login failed.
+        """
+        with self._lock:
+            now = dt.datetime.now()
+            if self._needs_login(now) and not self._login(now):
+                return None
+            return self._client
+
+    def collection(self, concept_id):
+        """Returns the cached Harmony Collection for a concept ID."""
+        with self._lock:
+            if concept_id not in self._collections:
+                self._collections[concept_id] = Collection(id=concept_id)
+            return self._collections[concept_id]
+
+    def collection_metadata(self, concept_id):
+        """
+        Returns the CMR (UMM) record of a collection, searched for only the
+        first time it is asked for.
+
+        Returns:
+            dict | None: The collection record, or None if CMR has no such collection.
+        """
+        with self._lock:
+            if concept_id not in self._collection_metadata:
+                collections = earthaccess.search_datasets(concept_id=concept_id)
+                self._collection_metadata[concept_id] = collections[0] if collections else None
+            return self._collection_metadata[concept_id]
+
+    def invalidate(self):
+        """Forces a new login (and Harmony client) on the next cycle."""
+        with self._lock:
+            self._auth = None
+
+
+_session = EarthdataSession()
+
+
+def get_session():
+    """Returns the process-wide Earthdata session."""
+    return _session
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import threading
+import datetime as dt
+import pandas as pd
+
+# --- Catalog Configuration ---
+# One SQLite catalog per data directory, in place of the old granule_log.csv.
+# WAL mode lets the web workers keep reading while the ingest writes.
+CATALOG_FILENAME = "granule_catalog.sqlite"
+LEGACY_LOG_FILENAME = "granule_log.csv"
+# How long a reader or writer waits for the other side's lock
+BUSY_TIMEOUT_MS = 5000
+
+# Columns of a catalog row, in table order
+CATALOG_COLUMNS = [
+    'product', 'granule_id', 'start_time', 'end_time',
+    'south', 'north', 'west', 'east',
+    'local_filepath', 'size_bytes', 'valid_pixels', 'total_pixels', 'ingested_at',
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS granules (
+    product         TEXT NOT NULL,
+    granule_id      TEXT NOT NULL,
+    start_time      TEXT NOT NULL,  -- UTC, fixed-width ISO 8601 so text order is time order
+    end_time        TEXT NOT NULL,
+    south           REAL,           -- bounding box of the stored (cropped) grid
+    north           REAL,
+    west            REAL,
+    east            REAL,
+    local_filepath  TEXT NOT NULL,
+    size_bytes      INTEGER,
+    valid_pixels    INTEGER,        -- QC summary: pixels the composite would accept
+    total_pixels    INTEGER,
+    ingested_at     TEXT NOT NULL,
+    PRIMARY KEY (product, granule_id)
+);
+CREATE INDEX IF NOT EXISTS idx_granules_product_start ON granules (product, start_time DESC);
+CREATE INDEX IF NOT EXISTS idx_granules_product_end ON granules (product, end_time);
+CREATE TABLE IF NOT EXISTS catalog_state (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_state (key, value) VALUES ('revision', 0);
+"""
+
+# Each thread keeps one connection per catalog file
+_local = threading.local()
+
+
+def catalog_path(data_dir):
+    return os.path.join(data_dir, CATALOG_FILENAME)
+
+
+def catalog_exists(data_dir):
+    """True if the directory has a catalog, or a granule_log.csv still to migrate."""
+    return os.path.exists(catalog_path(data_dir)) or os.path.exists(os.path.join(data_dir, LEGACY_LOG_FILENAME))
+
+
+def format_time(value):
+    """Formats a timestamp as the catalog's fixed-width UTC ISO 8601 text."""
+    timestamp = pd.Timestamp(value)
+    timestamp = timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _normalize_row(product, row):
+    row = dict(row)
+    record = {column: row.get(column) for column in CATALOG_COLUMNS}
+    record['product'] = product
+    record['start_time'] = format_time(row['start_time'])
+    record['end_time'] = format_time(row['end_time'])
+    # Logs written on Windows used backslashes; '/' works on every platform
+    record['local_filepath'] = str(row['local_filepath']).replace('\\', '/')
+    record['ingested_at'] = row.get('ingested_at') or format_time(dt.datetime.now(dt.timezone.utc))
+    for column in ('size_bytes', 'valid_pixels', 'total_pixels'):
+        if record[column] is not None and not pd.isna(record[column]):
+            record[column] = int(record[column])
+    return record
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT that also bumps the catalog revision."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.conn.execute("ROLLBACK")
+            return False
+        self.conn.execute("UPDATE catalog_state SET value = value + 1 WHERE key = 'revision'")
+        self.conn.execute("COMMIT")
+        return False
+
+
+def _insert(conn, rows):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO granules ({', '.join(CATALOG_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in CATALOG_COLUMNS)})",
+        [tuple(row[column] for column in CATALOG_COLUMNS) for row in rows]
+    )
+
+
+def _import_legacy_log(conn, product, data_dir):
+    """
+    Imports a granule_log.csv into a newly created catalog. The file is left
+    in place (it is tracked in git) and never read again.
+    """
+    log_file = os.path.join(data_dir, LEGACY_LOG_FILENAME)
+    if not os.path.exists(log_file):
+        return
+    try:
+        log_df = pd.read_csv(log_file)
+    except pd.errors.EmptyDataError:
+        log_df = pd.DataFrame()
+    rows = [_normalize_row(product, row) for _, row in log_df.iterrows()]
+    with _transaction(conn):
+        # Another thread may have created the catalog at the same moment
+        if conn.execute("SELECT 1 FROM catalog_state WHERE key = 'legacy_log_imported'").fetchone():
+            return
+        _insert(conn, rows)
+        conn.execute("INSERT INTO catalog_state (key, value) VALUES ('legacy_log_imported', 1)")
+    print(f"Imported {len(rows)} granule(s) from '{log_file}' into the catalog.")
+
+
+def open_catalog(product, data_dir):
+    """
+    Returns this thread's connection to a data directory's catalog, creating
+    the catalog (and importing a legacy granule_log.csv) the first time.
+    """
+    path = os.path.abspath(catalog_path(data_dir))
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(data_dir, exist_ok=True)
+        created = not os.path.exists(path)
+        # Autocommit; writes take explicit BEGIN IMMEDIATE transactions
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.executescript(_SCHEMA)
+        if created:
+            _import_legacy_log(conn, product, data_dir)
+        connections[path] = conn
+    return conn
+
+
+def catalog_revision(product, data_dir):
+    """
+    Returns a number that changes with every write to the catalog, so readers
+    can tell whether their loaded granules are still current.
+    """
+    conn = open_catalog(product, data_dir)
+    return conn.execute("SELECT value FROM catalog_state WHERE key = 'revision'").fetchone()[0]
+
+
+def list_granules(product, data_dir, limit=None):
+    """
+    Returns a product's catalogued granules, newest first.
+
+    Returns:
+        pd.DataFrame: One row per granule with the CATALOG_COLUMNS.
+    """
+    conn = open_catalog(product, data_dir)
+    cursor = conn.execute(
+        f"SELECT {', '.join(CATALOG_COLUMNS)} FROM granules WHERE product = ? "
+        "ORDER BY start_time DESC LIMIT ?",
+        (product, -1 if limit is None else int(limit))
+    )
+    return pd.DataFrame([tuple(r) for r in cursor.fetchall()], columns=CATALOG_COLUMNS)
+
+
+def granules_covering(product, lat, lon, data_dir, limit=None, min_end_time=None):
+    """
+    Returns the product's granules whose bounding box holds the point and that
+    have valid pixels at all, newest first. The first row is the latest valid
+    granule covering the point. Granules imported from a granule_log.csv have
+    no bounding box or QC summary and are assumed to cover everything.
+
+    Args:
+        min_end_time: Optionally, only granules ending at or after this time.
+
+    Returns:
+        pd.DataFrame: The matching catalog rows.
+    """
+    conn = open_catalog(product, data_dir)
+    cursor = conn.execute(
+        f"SELECT {', '.join(CATALOG_COLUMNS)} FROM granules "
+        "WHERE product = ? AND end_time >= ? "
+        "AND (south IS NULL OR (south <= ? AND north >= ? AND west <= ? AND east >= ?)) "
+        "AND (valid_pixels IS NULL OR valid_pixels > 0) "
+        "ORDER BY start_time DESC LIMIT ?",
+        (product, '' if min_end_time is None else format_time(min_end_time),
+         lat, lat, lon, lon, -1 if limit is None else int(limit))
+    )
+    return pd.DataFrame([tuple(r) for r in cursor.fetchall()], columns=CATALOG_COLUMNS)
+
+
+def replace_granules(product, data_dir, add_rows=(), remove_ids=()):
+    """
+    Adds and removes catalog entries in one transaction, so readers see
+    either the old set of granules or the new one.
+
+    Args:
+        add_rows (list[dict]): Granules to add (at least granule_id, start_time,
+                               end_time and local_filepath).
+        remove_ids (iterable): Granule IDs to drop.
+    """
+    conn = open_catalog(product, data_dir)
+    rows = [_normalize_row(product, row) for row in add_rows]
+    with _transaction(conn):
+        conn.executemany(
+            "DELETE FROM granules WHERE product = ? AND granule_id = ?",
+            [(product, granule_id) for granule_id in remove_ids]
+        )
+        _insert(conn, rows)
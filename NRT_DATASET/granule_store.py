@@ -0,0 +1,380 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import xarray as xr
+from NRT_DATASET.point_extractor import prepare_grid, extract_points, nearest_index, within_axis, neighbourhood_fields
+from NRT_DATASET.tempo_products import PRODUCTS, INGEST_SETTINGS
+from NRT_DATASET.compact_granule import is_compact, load_compact_grid, load_composite, load_time_cube
+from NRT_DATASET.granule_catalog import catalog_exists, catalog_revision, list_granules, granules_covering
+
+# --- Product Configuration ---
+# Data directories, variables, extraction rule and scaling come from the
+# product table (config/tempo_products.json).
+MAX_GRANULES = INGEST_SETTINGS['max_granules'] # Default number of latest granules a product keeps
+# TEMPO scans hourly; a requested time farther than this from every scan in
+# the time cube (e.g. at night) gets no value
+MAX_SCAN_GAP = np.timedelta64(60, 'm')
+
+# (product, data_dir) -> snapshot. A snapshot is never modified after it is
+# published; a catalog change builds a new one and swaps the reference in.
+_snapshots = {}
+_load_locks = {}
+_locks_guard = threading.Lock()
+
+
+def normalize_path(path):
+    """Logs written on Windows used backslashes; '/' works on every platform."""
+    return str(path).replace('\\', '/')
+
+
+def load_grid(file_path, config):
+    """
+    Opens one granule file and returns (data, qc, grid). Compact granules are
+    memory-mapped and come back with data and qc set to None.
+    """
+    if is_compact(file_path):
+        # Converted at ingest: memory-mapped arrays, no HDF5 parsing
+        return None, None, load_compact_grid(file_path)
+
+    qc = None
+    with xr.open_datatree(file_path) as datatree:
+        data = datatree[config['data_var']].load()
+        if config['qc_var'] is not None:
+            qc = datatree[config['qc_var']].load()
+    grid = prepare_grid(data, qc, config['rule'])
+    # Computed once per granule so each request's interp decision is a lookup
+    grid.update(neighbourhood_fields(grid['values'], grid['qc'], config['rule']))
+    return data, qc, grid
+
+
+def _load_granule(row, config, previous):
+    """
+    Loads one granule's arrays, reusing an unchanged previous load. Compact
+    granules are memory-mapped and have no 'data'/'qc' DataArrays, only a 'grid'.
+    """
+    file_path = normalize_path(row['local_filepath'])
+    granule = {
+        'granule_id': row['granule_id'],
+        'start_time': row['start_time'],
+        'end_time': row['end_time'],
+        'local_filepath': file_path,
+        'data': None,
+        'qc': None,
+        'grid': None,
+        'error': None,
+    }
+
+    old = previous.get(row['granule_id'])
+    if old is not None and old['local_filepath'] == file_path and old['error'] is None:
+        granule['data'], granule['qc'], granule['grid'] = old['data'], old['qc'], old['grid']
+        return granule
+
+    try:
+        granule['data'], granule['qc'], granule['grid'] = load_grid(file_path, config)
+    except Exception as e:
+        granule['error'] = e
+    return granule
+
+
+def _build_snapshot(product, data_dir, version, previous_snapshot):
+    """Reads the catalog and loads the latest granules listed in it."""
+    config = PRODUCTS[product]
+    catalog_df = list_granules(product, data_dir, config['max_granules'])
+    previous = {}
+    if previous_snapshot is not None:
+        previous = {g['granule_id']: g for g in previous_snapshot['granules']}
+
+    granules = [
+        _load_granule(row, config, previous)
+        for _, row in catalog_df.iterrows()
+    ]
+    print(f"Loaded {len(granules)} {product} granule(s) into memory.")
+    return {
+        'version': version,
+        'granules': granules,
+        'composite': _load_matching_composite(data_dir, granules),
+        'cube': _load_cube(data_dir),
+    }
+
+
+def _load_matching_composite(data_dir, granules):
+    """Loads the product's composite if it was built from exactly these granules."""
+    try:
+        composite = load_composite(data_dir)
+    except Exception as e:
+        print(f"Warning: Could not load composite: {e}")
+        return None
+    if composite is None:
+        return None
+    if [g['granule_id'] for g in composite['granules']] != [g['granule_id'] for g in granules]:
+        print("Composite does not match the granule catalog; trying granules in order instead.")
+        return None
+    return composite
+
+
+def _load_cube(data_dir):
+    try:
+        return load_time_cube(data_dir)
+    except Exception as e:
+        print(f"Warning: Could not load time cube: {e}")
+        return None
+
+
+def _get_load_lock(key):
+    with _locks_guard:
+        return _load_locks.setdefault(key, threading.Lock())
+
+
+def _get_snapshot(product, data_dir=None):
+    """
+    Returns the current snapshot for a product, or None if it has no catalog.
+
+    The granules are only re-read when the catalog revision changes; the
+    granule arrays are then reloaded and swapped in atomically. While one
+    thread reloads, other readers keep getting the previous complete set.
+    """
+    data_dir = data_dir or PRODUCTS[product]['data_dir']
+    key = (product, os.path.abspath(data_dir))
+    if not catalog_exists(data_dir):
+        return None
+    version = catalog_revision(product, data_dir)
+
+    snapshot = _snapshots.get(key)
+    if snapshot is None or snapshot['version'] != version:
+        load_lock = _get_load_lock(key)
+        # Only the first reader blocks; later ones serve the current snapshot
+        if load_lock.acquire(blocking=snapshot is None):
+            try:
+                snapshot = _snapshots.get(key)
+                if snapshot is None or snapshot['version'] != version:
+                    new_snapshot = _build_snapshot(product, data_dir, version, snapshot)
+                    _snapshots[key] = new_snapshot
+                    snapshot = new_snapshot
+            finally:
+                load_lock.release()
+    return snapshot
+
+
+def get_granules(product, data_dir=None):
+    """
+    Returns the in-memory granules for a product, newest first.
+
+    Args:
+        product (str): One of PRODUCTS ('NO2', 'HCHO', 'O3').
+        data_dir (str): Directory holding the granule catalog. Defaults to the product's.
+
+    Returns:
+        list[dict] | None: Granule entries with a 'grid' (or an 'error' if the
+                           file could not be read), or None if there is no
+                           catalog.
+    """
+    snapshot = _get_snapshot(product, data_dir)
+    return snapshot['granules'] if snapshot is not None else None
+
+
+def _grid_pixels(grid, lats, lons):
+    """Nearest pixel of a composite or cube for each point, and whether the point is on the grid at all."""
+    i = nearest_index(grid['lat'], lats, grid['lat_step'])
+    j = nearest_index(grid['lon'], lons, grid['lon_step'])
+    on_grid = within_axis(grid['lat'], lats, grid['lat_step']) & within_axis(grid['lon'], lons, grid['lon_step'])
+    return i, j, on_grid
+
+
+def _composite_sources(composite, lats, lons):
+    """Source granule index of the composite pixel nearest to each point (-1: none, or off the grid)."""
+    i, j, on_grid = _grid_pixels(composite, lats, lons)
+    return np.where(on_grid, np.asarray(composite['source'][i, j], dtype=int), -1)
+
+
+def select_granules(product, lat, lon, data_dir=None):
+    """
+    Returns the granules a point lookup should try, in order: the loaded
+    granules the catalog says cover the point and have valid pixels, newest
+    first. With a composite, the freshest granule holding a good pixel at the
+    point comes first, as it is the one that usually answers.
+
+    Returns:
+        list[dict] | None: Granule entries, or None if there is no catalog.
+    """
+    snapshot = _get_snapshot(product, data_dir)
+    if snapshot is None:
+        return None
+    data_dir = data_dir or PRODUCTS[product]['data_dir']
+    covering = set(granules_covering(product, lat, lon, data_dir, PRODUCTS[product]['max_granules'])['granule_id'])
+    granules = [g for g in snapshot['granules'] if g['granule_id'] in covering]
+    composite = snapshot['composite']
+    if composite is None:
+        return granules
+
+    source = _composite_sources(composite, np.array([lat], dtype=float), np.array([lon], dtype=float))[0]
+    if source < 0:
+        return granules
+    first = snapshot['granules'][source]
+    return [first] + [g for g in granules if g is not first]
+
+
+def _extract_into(result, granule, indices, lats, lons, config):
+    """Tries one granule for the points at indices, filling result where it yields a positive value."""
+    if granule['error'] is not None:
+        print(f"Skipping {os.path.basename(granule['local_filepath'])}: {granule['error']}")
+        return
+    extracted = extract_points(granule['grid'], lats[indices], lons[indices], config['rule'])
+    values = np.round(extracted['value'] / config['scale'], 2)
+    found = np.isfinite(values) & (values > 0)
+    hits = indices[found]
+
+    result['value'][hits] = values[found]
+    result['method'][hits] = extracted['method'][found]
+    result['qc_pass'][indices] = extracted['qc_pass']
+    result['granule_id'][hits] = granule['granule_id']
+    result['end_time'][hits] = granule['end_time']
+
+
+def get_point_values(product, lats, lons, data_dir=None):
+    """
+    Batch version of the get_*_value granule loop: every point takes its value
+    from the newest in-memory granule that yields a positive value for it.
+    With a composite, each point first tries the granule the composite names
+    for its pixel; only the points left without a value go through the rest.
+
+    The 2-hour staleness check and the WeatherAPI fallback are per-request
+    decisions and are left to the caller (see 'end_time').
+
+    Args:
+        product (str): One of PRODUCTS ('NO2', 'HCHO', 'O3').
+        lats (array-like): Latitudes of the points.
+        lons (array-like): Longitudes of the points.
+        data_dir (str): Directory holding the granule catalog. Defaults to the product's.
+
+    Returns:
+        dict | None: Per-point arrays 'value' (scaled and rounded like
+                     get_point_value, NaN if no granule had one), 'method',
+                     'qc_pass', 'granule_id' and 'end_time' (None where no
+                     value was found), or None if there is no catalog.
+    """
+    config = PRODUCTS[product]
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    snapshot = _get_snapshot(product, data_dir)
+    if snapshot is None:
+        return None
+    granules, composite = snapshot['granules'], snapshot['composite']
+
+    result = {
+        'value': np.full(lats.shape, np.nan),
+        'method': np.full(lats.shape, 'nearest', dtype=object),
+        'qc_pass': np.zeros(lats.shape, dtype=bool),
+        'granule_id': np.full(lats.shape, None, dtype=object),
+        'end_time': np.full(lats.shape, None, dtype=object),
+    }
+    # Granule each point has already tried (-1: none)
+    tried = np.full(lats.shape, -1, dtype=int)
+    if composite is not None:
+        tried = _composite_sources(composite, lats, lons)
+        for k in np.unique(tried[tried >= 0]):
+            _extract_into(result, granules[k], np.flatnonzero(tried == k), lats, lons, config)
+
+    # Newest first, as in get_point_value; e.g. a NaN interp corner in the
+    # source granule leaves a point to an older granule
+    pending = np.flatnonzero(np.isnan(result['value']))
+    for k, granule in enumerate(granules):
+        candidates = pending[tried[pending] != k]
+        if candidates.size == 0:
+            continue
+        _extract_into(result, granule, candidates, lats, lons, config)
+        pending = pending[np.isnan(result['value'][pending])]
+    return result
+
+
+def _nearest_scans(scan_times, targets):
+    """Index of the scan whose mid-time is nearest to each target time."""
+    k = np.searchsorted(scan_times, targets)
+    if scan_times.size == 1:
+        return np.zeros(targets.shape, dtype=int)
+    k = np.clip(k, 1, scan_times.size - 1)
+    take_earlier = (targets - scan_times[k - 1]) <= (scan_times[k] - targets)
+    return np.where(take_earlier, k - 1, k)
+
+
+def get_point_series(product, lats, lons, data_dir=None):
+    """
+    Intraday evolution at points: the value of every scan in the product's
+    rolling time cube, read in one vectorized access.
+
+    Cube values are the scans' good pixels at the nearest grid node (the
+    composite's per-pixel rule), scaled and rounded like get_point_value;
+    the granule files of older scans are no longer on disk.
+
+    Args:
+        product (str): One of PRODUCTS ('NO2', 'HCHO', 'O3').
+        lats (array-like): Latitudes of the points.
+        lons (array-like): Longitudes of the points.
+        data_dir (str): Directory holding the granule catalog. Defaults to the product's.
+
+    Returns:
+        dict | None: 'time' (scan mid-times, UTC datetime64, oldest first),
+                     'granule_id' (one per scan) and 'value' (points x scans,
+                     NaN where a scan had no good pixel or the point is off
+                     the grid), or None if the product has no time cube.
+    """
+    config = PRODUCTS[product]
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    snapshot = _get_snapshot(product, data_dir)
+    if snapshot is None or snapshot['cube'] is None:
+        return None
+    cube = snapshot['cube']
+
+    i, j, on_grid = _grid_pixels(cube, lats, lons)
+    values = np.asarray(cube['values'][:, i, j], dtype=float).T
+    values[~on_grid] = np.nan
+    return {
+        'time': cube['time'],
+        'granule_id': [g['granule_id'] for g in cube['granules']],
+        'value': np.round(values / config['scale'], 2),
+    }
+
+
+def get_point_values_at(product, lats, lons, times=None, data_dir=None, max_gap=MAX_SCAN_GAP):
+    """
+    Values at points for given times (e.g. a school activity hour), each from
+    the scan in the rolling time cube nearest in time, in one vectorized read.
+    Values follow the rule of get_point_series.
+
+    Args:
+        product (str): One of PRODUCTS ('NO2', 'HCHO', 'O3').
+        lats (array-like): Latitudes of the points.
+        lons (array-like): Longitudes of the points.
+        times: One time for all points or one per point (naive times are UTC).
+               Defaults to now.
+        data_dir (str): Directory holding the granule catalog. Defaults to the product's.
+        max_gap (np.timedelta64): Points whose nearest scan is farther than this get NaN.
+
+    Returns:
+        dict | None: Per-point arrays 'value', 'time' (mid-time of the scan
+                     used) and 'granule_id' (None where no scan was close
+                     enough or the point is off the grid), or None if the
+                     product has no time cube.
+    """
+    config = PRODUCTS[product]
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    snapshot = _get_snapshot(product, data_dir)
+    if snapshot is None or snapshot['cube'] is None:
+        return None
+    cube = snapshot['cube']
+
+    if times is None:
+        times = pd.Timestamp.now(tz='UTC')
+    targets = pd.to_datetime(np.atleast_1d(times), utc=True).tz_localize(None).values.astype('datetime64[s]')
+    targets = np.broadcast_to(targets, lats.shape)
+
+    k = _nearest_scans(cube['time'], targets)
+    i, j, on_grid = _grid_pixels(cube, lats, lons)
+    values = np.round(np.asarray(cube['values'][k, i, j], dtype=float) / config['scale'], 2)
+    granule_ids = np.array([g['granule_id'] for g in cube['granules']], dtype=object)[k]
+    too_far = (np.abs(cube['time'][k] - targets) > max_gap) | ~on_grid
+    values[too_far] = np.nan
+    granule_ids[too_far] = None
+    return {'value': values, 'time': cube['time'][k], 'granule_id': granule_ids}
@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from NRT_DATASET.compact_granule import remove_granule_files
+
+# --- Ingestion Configuration ---
+# Harmony jobs (submit, wait, download, convert) running at once across all products
+TEMPO_INGEST_WORKERS = int(os.environ.get("TEMPO_INGEST_WORKERS", "4"))
+
+# Shared by every product so the total number of in-flight Harmony jobs stays bounded
+_granule_pool = ThreadPoolExecutor(max_workers=TEMPO_INGEST_WORKERS, thread_name_prefix="tempo-granule")
+
+
+def run_granule_jobs(job, granules):
+    """
+    Runs job(granule) for every granule on the shared worker pool and waits for all of them.
+
+    Keeps the fetchers' all-or-nothing behaviour: if any job fails, the files
+    the other jobs downloaded are removed and None is returned, so the caller
+    leaves its log and existing files untouched.
+
+    Args:
+        job (callable): Processes one granule; returns a log row dict (with
+                        'local_filepath') or None to skip it, raises on failure.
+        granules (list): The granules to process.
+
+    Returns:
+        list[dict] | None: The log rows of the processed granules, in input
+                           order, or None if any job failed.
+    """
+    futures = [_granule_pool.submit(job, granule) for granule in granules]
+    rows, failed = [], False
+    for future in futures:
+        try:
+            row = future.result()
+        except Exception as e:
+            print(f"A granule job failed: {e}")
+            failed = True
+            continue
+        if row is not None:
+            rows.append(row)
+
+    if failed:
+        print("Aborting operation to prevent data inconsistency.")
+        for row in rows:
+            try:
+                remove_granule_files(row['local_filepath'])
+            except OSError as e:
+                print(f"   - Error removing partial download {row['local_filepath']}: {e}")
+        return None
+    return rows
+
+
+def run_ingest_cycle(jobs):
+    """
+    Runs the product jobs concurrently and waits for all of them. A failing
+    job is reported and does not stop the others.
+
+    Args:
+        jobs (dict): Product name -> callable taking no arguments.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(len(jobs), 1), thread_name_prefix="tempo-product") as pool:
+        futures = {pool.submit(job): name for name, job in jobs.items()}
+        for future, name in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"{name} ingest failed: {e}")
+    print(f"Ingest cycle finished in {time.perf_counter() - start:.1f} s.")
@@ -0,0 +1,346 @@
+import math
+import numpy as np
+
+# --- Decision Rules ---
+# 'qc_masked'   : NO2/HCHO get_point_value. A nearest pixel flagged 2 is rejected;
+#                 neighbour stats use only QC == 0 pixels; interp needs >= 4 of them.
+# 'variability' : O3 get_point_value. Neighbour stats use every finite pixel;
+#                 interp also needs >= 66% good QC when a QC array exists.
+RULE_QC_MASKED = 'qc_masked'
+RULE_VARIABILITY = 'variability'
+REL_STD_THRESHOLD = 0.10
+MIN_GOOD_QC_FRACTION = 0.66
+# An axis counts as regular when no coordinate is further than this fraction of
+# a step from its evenly spaced position (keeps arithmetic indices within +-1)
+REGULAR_AXIS_TOLERANCE = 0.25
+
+# Row/column offsets of the 3x3 neighbourhood, in the row-major order of the original subset
+_ROW_OFFSETS = np.repeat([-1, 0, 1], 3)
+_COL_OFFSETS = np.tile([-1, 0, 1], 3)
+
+LAT_NAMES = ("latitude", "lat", "y")
+LON_NAMES = ("longitude", "lon", "x")
+
+
+def prepare_grid(da, qc_da=None, rule=RULE_QC_MASKED):
+    """
+    Turns a granule's DataArray (and optional QC DataArray) into plain numpy
+    arrays on ascending lat/lon axes, using the first time slice.
+
+    Returns:
+        dict: 'values' (n_lat, n_lon), 'qc' (same shape or None), 'lat', 'lon',
+              'lat_step'/'lon_step' (spacing of regular axes, else None), and
+              'exact_nodes' (whether get_point_value interpolates a 2-D array,
+              which changes how xarray treats exact grid-node hits).
+    """
+    # The O3 rule keeps a length-1 time axis, so its interp runs on 3-D data
+    exact_nodes = da.ndim - ("time" in da.dims) == 2
+    if rule == RULE_VARIABILITY and "time" in da.dims and da.sizes["time"] == 1:
+        exact_nodes = False
+
+    arr, qc = da, qc_da
+    if "time" in arr.dims:
+        arr = arr.isel(time=0)
+        qc = qc.isel(time=0) if qc is not None else None
+
+    latname = next((n for n in LAT_NAMES if n in arr.coords), None)
+    lonname = next((n for n in LON_NAMES if n in arr.coords), None)
+    if latname is None or lonname is None:
+        raise ValueError("Latitude/Longitude coordinates not found in DataArray")
+
+    lat = np.asarray(arr[latname].values, dtype=float)
+    lon = np.asarray(arr[lonname].values, dtype=float)
+    values = np.asarray(arr.transpose(latname, lonname).values)
+    qc_values = np.asarray(qc.transpose(latname, lonname).values) if qc is not None else None
+
+    # Work on ascending axes; flipping is a view, not a copy
+    if lat.size > 1 and lat[0] > lat[-1]:
+        lat, values = lat[::-1], values[::-1, :]
+        qc_values = qc_values[::-1, :] if qc_values is not None else None
+    if lon.size > 1 and lon[0] > lon[-1]:
+        lon, values = lon[::-1], values[:, ::-1]
+        qc_values = qc_values[:, ::-1] if qc_values is not None else None
+
+    return {
+        'values': values, 'qc': qc_values, 'lat': lat, 'lon': lon,
+        'lat_step': axis_step(lat), 'lon_step': axis_step(lon),
+        'exact_nodes': exact_nodes,
+    }
+
+
+# --- Index Helpers ---
+
+def axis_step(axis):
+    """Returns the spacing of an evenly spaced ascending axis, or None if it is irregular."""
+    if axis.size < 2:
+        return None
+    step = (axis[-1] - axis[0]) / (axis.size - 1)
+    if not step > 0:
+        return None
+    deviation = np.abs(axis - (axis[0] + np.arange(axis.size) * step))
+    if np.max(deviation) > REGULAR_AXIS_TOLERANCE * step:
+        return None
+    return float(step)
+
+
+def searchsorted_left(axis, targets, step=None):
+    """
+    np.searchsorted(axis, targets, side="left") for an ascending axis.
+
+    On a regular axis the position comes from arithmetic and is then corrected
+    by one step against the stored coordinates, so rounding in the axis values
+    gives exactly the binary-search answer in O(1) per point.
+    """
+    if step is None:
+        return np.searchsorted(axis, targets, side="left")
+
+    n = axis.size
+    if targets.size == 1:
+        # Plain float arithmetic; a handful of numpy calls would cost more than the lookup
+        return np.array([_searchsorted_regular_scalar(axis, float(targets.flat[0]), step)]).reshape(targets.shape)
+
+    with np.errstate(invalid="ignore"):
+        guess = np.ceil((targets - axis[0]) / step)
+    idx = np.maximum(np.fmin(guess, n), 0).astype(np.int64)  # NaN sorts last, like searchsorted
+    idx = np.where((idx < n) & (axis[np.minimum(idx, n - 1)] < targets), idx + 1, idx)
+    idx = np.where((idx > 0) & (axis[np.maximum(idx - 1, 0)] >= targets), idx - 1, idx)
+    return idx
+
+
+def _searchsorted_regular_scalar(axis, target, step):
+    n = axis.size
+    if target != target:
+        return n
+    idx = min(max(math.ceil((target - axis[0]) / step), 0), n)
+    if idx < n and axis[idx] < target:
+        idx += 1
+    if idx > 0 and axis[idx - 1] >= target:
+        idx -= 1
+    return idx
+
+
+def nearest_index(axis, targets, step=None):
+    """
+    Index of the nearest axis value for each target (ascending axis), with the
+    same tie-breaking as xarray's sel(method="nearest"). Targets outside the
+    axis snap to the closest edge.
+    """
+    n = axis.size
+    right = np.clip(searchsorted_left(axis, targets, step), 0, n - 1)
+    left = np.clip(right - 1, 0, n - 1)
+    use_left = np.abs(targets - axis[left]) < np.abs(axis[right] - targets)
+    return np.where(use_left, left, right)
+
+
+def within_axis(axis, targets, step=None):
+    """
+    True for targets no further than half a grid step outside an ascending
+    axis, i.e. on a pixel of the grid. nearest_index snaps the others to the
+    edge, which a cropped granule must not answer for.
+    """
+    half = (step if step is not None else float(np.max(np.diff(axis), initial=0.0))) / 2
+    return (targets >= axis[0] - half) & (targets <= axis[-1] + half)
+
+
+def _bracket(axis, targets, step=None):
+    """Lower/upper bracketing indices and an in-range mask, like scipy's interp1d."""
+    n = axis.size
+    hi = np.clip(searchsorted_left(axis, targets, step), 1, max(n - 1, 1))
+    lo = hi - 1
+    inside = (targets >= axis[0]) & (targets <= axis[-1])
+    return lo, hi, inside
+
+
+def _lerp(y_lo, y_hi, x_lo, x_hi, x, exact_nodes=False):
+    slope = (y_hi - y_lo) / (x_hi - x_lo)
+    result = slope * (x - x_lo) + y_lo
+    if exact_nodes:
+        # np.interp returns the node value itself on an exact hit, so a NaN
+        # neighbour does not spill into it
+        result = np.where(x == x_lo, y_lo, np.where(x == x_hi, y_hi, result))
+    return result
+
+
+def interpolate_points(grid, lats, lons, lat_bracket=None, lon_bracket=None):
+    """
+    Linear interpolation along latitude, then longitude (the order xarray's
+    interp({lat, lon}) applies: interp1d for the first pass, and np.interp for
+    the last one when the array is 2-D). Points outside the grid return NaN.
+    """
+    values, lat_axis, lon_axis = grid['values'], grid['lat'], grid['lon']
+    if lat_axis.size < 2 or lon_axis.size < 2:
+        return np.full(lats.shape, np.nan)
+
+    i_lo, i_hi, lat_in = lat_bracket if lat_bracket is not None else _bracket(lat_axis, lats, grid.get('lat_step'))
+    j_lo, j_hi, lon_in = lon_bracket if lon_bracket is not None else _bracket(lon_axis, lons, grid.get('lon_step'))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        at_j_lo = _lerp(values[i_lo, j_lo], values[i_hi, j_lo], lat_axis[i_lo], lat_axis[i_hi], lats)
+        at_j_hi = _lerp(values[i_lo, j_hi], values[i_hi, j_hi], lat_axis[i_lo], lat_axis[i_hi], lats)
+        result = _lerp(at_j_lo, at_j_hi, lon_axis[j_lo], lon_axis[j_hi], lons, grid['exact_nodes'])
+    return np.where(lat_in & lon_in, result, np.nan)
+
+
+# --- Neighbourhood Statistics ---
+
+def _neighbourhood_stats(neighbour_vals, in_bounds, good_qc, rule):
+    """
+    3x3 statistics and the interp decision from neighbours stacked along axis 0
+    (in _ROW_OFFSETS/_COL_OFFSETS order). Per-point and grid-wide callers share
+    this so both sum in the same order and reach the same decisions.
+    """
+    valid = in_bounds & np.isfinite(neighbour_vals)
+    if rule == RULE_QC_MASKED and good_qc is not None:
+        valid &= good_qc
+    neighbour_vals = np.where(valid, neighbour_vals, 0.0)
+
+    n_valid = valid.sum(axis=0).astype(float)
+    good_fraction = None
+    with np.errstate(invalid="ignore", divide="ignore"):
+        local_mean = neighbour_vals.sum(axis=0) / n_valid
+        local_var = np.where(valid, (neighbour_vals - local_mean) ** 2, 0.0).sum(axis=0) / n_valid
+        local_std = np.sqrt(local_var)
+        small_mean = np.abs(local_mean) <= 1e-9
+
+        if rule == RULE_QC_MASKED:
+            rel_std = local_std / np.where(small_mean, 1.0, np.abs(local_mean))
+            use_interp = (n_valid >= 4) & (n_valid > 1) & (rel_std < REL_STD_THRESHOLD)
+        else:
+            rel_std = np.where(small_mean, 0.0, local_std / np.abs(local_mean))
+            use_interp = (n_valid > 0) & (rel_std < REL_STD_THRESHOLD)
+            if good_qc is not None:
+                good_fraction = (good_qc & valid).sum(axis=0) / n_valid
+                use_interp &= good_fraction >= MIN_GOOD_QC_FRACTION
+
+    return {'n_valid': n_valid, 'rel_std': rel_std, 'good_fraction': good_fraction, 'interp': use_interp}
+
+
+def neighbourhood_fields(values, qc=None, rule=RULE_QC_MASKED, block_rows=128):
+    """
+    Computes the 3x3 neighbourhood statistics for every pixel of a granule with
+    shifted-window sums, a block of rows at a time to bound memory.
+
+    Returns:
+        dict: 'n_valid' (uint8), 'rel_std' (float32), 'good_fraction' (float32,
+              only for the variability rule with QC, else None) and 'interp'
+              (bool, the decision get_point_value makes at that nearest pixel).
+    """
+    n_lat, n_lon = values.shape
+    fields = {
+        'n_valid': np.zeros((n_lat, n_lon), dtype=np.uint8),
+        'rel_std': np.full((n_lat, n_lon), np.nan, dtype=np.float32),
+        'good_fraction': None,
+        'interp': np.zeros((n_lat, n_lon), dtype=bool),
+    }
+    if rule != RULE_QC_MASKED and qc is not None:
+        fields['good_fraction'] = np.full((n_lat, n_lon), np.nan, dtype=np.float32)
+
+    for r0 in range(0, n_lat, block_rows):
+        r1 = min(r0 + block_rows, n_lat)
+        lo, hi = max(r0 - 1, 0), min(r1 + 1, n_lat)
+        # Block plus a one-pixel halo; pixels beyond the grid edge are out of bounds
+        padded = np.full((r1 - r0 + 2, n_lon + 2), np.nan)
+        inside = np.zeros(padded.shape, dtype=bool)
+        padded[lo - r0 + 1:hi - r0 + 1, 1:-1] = values[lo:hi]
+        inside[lo - r0 + 1:hi - r0 + 1, 1:-1] = True
+        good = None
+        if qc is not None:
+            good = np.zeros(padded.shape, dtype=bool)
+            good[lo - r0 + 1:hi - r0 + 1, 1:-1] = np.asarray(qc[lo:hi]) == 0
+
+        rows = r1 - r0
+        def shifted(a):
+            return np.stack([a[1 + di:1 + di + rows, 1 + dj:1 + dj + n_lon]
+                             for di, dj in zip(_ROW_OFFSETS, _COL_OFFSETS)])
+
+        stats = _neighbourhood_stats(shifted(padded), shifted(inside),
+                                     shifted(good) if good is not None else None, rule)
+        fields['n_valid'][r0:r1] = stats['n_valid']
+        fields['rel_std'][r0:r1] = stats['rel_std']
+        fields['interp'][r0:r1] = stats['interp']
+        if fields['good_fraction'] is not None:
+            fields['good_fraction'][r0:r1] = stats['good_fraction']
+    return fields
+
+
+# --- Batch Extraction ---
+
+def extract_points(grid, lats, lons, rule=RULE_QC_MASKED, lat_idx=None, lon_idx=None, interp_vals=None):
+    """
+    Extracts values for many points from one granule grid in a single
+    vectorized pass, using the 3x3-neighbourhood relative-std rule of the
+    product's get_point_value.
+
+    Args:
+        grid (dict): Output of prepare_grid or load_compact_grid. With an
+                     'interp' field (see neighbourhood_fields) the decision
+                     is looked up instead of recomputed.
+        lats (array-like): Target latitudes.
+        lons (array-like): Target longitudes.
+        rule (str): RULE_QC_MASKED (NO2/HCHO) or RULE_VARIABILITY (O3).
+        lat_idx, lon_idx (np.ndarray): Precomputed nearest indices (optional).
+        interp_vals (np.ndarray): Precomputed interpolated values (optional).
+
+    Returns:
+        dict: 'value' (unscaled, unrounded; NaN when rejected or off the grid), 'qc_pass'
+              (False when the nearest pixel's QC flag rejects it), 'method'
+              ('nearest' or 'interp'), 'lat_idx' and 'lon_idx'.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    values, qc = grid['values'], grid['qc']
+    n_lat, n_lon = values.shape
+
+    # 1. Nearest pixel and its QC decision
+    if lat_idx is None:
+        lat_idx = nearest_index(grid['lat'], lats, grid.get('lat_step'))
+    if lon_idx is None:
+        lon_idx = nearest_index(grid['lon'], lons, grid.get('lon_step'))
+    nearest_vals = values[lat_idx, lon_idx].astype(float)
+
+    qc_pass = np.ones(lats.shape, dtype=bool)
+    if rule == RULE_QC_MASKED and qc is not None:
+        qc_pass = qc[lat_idx, lon_idx] != 2
+
+    # 2. Interpolated value
+    if interp_vals is None:
+        interp_vals = interpolate_points(grid, lats, lons)
+
+    # 3. Interp-vs-nearest decision from the 3x3 neighbourhood of the nearest pixel
+    if grid.get('interp') is not None:
+        # Precomputed for the whole granule at ingest
+        use_interp = np.asarray(grid['interp'][lat_idx, lon_idx], dtype=bool)
+    else:
+        ii = lat_idx[None, :] + _ROW_OFFSETS[:, None]
+        jj = lon_idx[None, :] + _COL_OFFSETS[:, None]
+        in_bounds = (ii >= 0) & (ii < n_lat) & (jj >= 0) & (jj < n_lon)
+        ii, jj = np.minimum(np.maximum(ii, 0), n_lat - 1), np.minimum(np.maximum(jj, 0), n_lon - 1)
+        neighbour_vals = values[ii, jj].astype(float)
+        good_qc = (qc[ii, jj] == 0) if qc is not None else None
+        use_interp = _neighbourhood_stats(neighbour_vals, in_bounds, good_qc, rule)['interp']
+
+    chosen = np.where(use_interp, interp_vals, nearest_vals)
+    chosen = np.where(qc_pass, chosen, np.nan)
+    # Points beyond the grid (e.g. outside a cropped granule) have no pixel of their own
+    on_grid = within_axis(grid['lat'], lats, grid.get('lat_step')) & within_axis(grid['lon'], lons, grid.get('lon_step'))
+    chosen = np.where(on_grid, chosen, np.nan)
+    return {
+        'value': chosen,
+        'qc_pass': qc_pass,
+        'method': np.where(use_interp, 'interp', 'nearest'),
+        'lat_idx': lat_idx,
+        'lon_idx': lon_idx,
+    }
+
+
+def extract_value(grid, lat, lon, rule=RULE_QC_MASKED, scale=1):
+    """
+    Single-point version of extract_points, returning what get_point_value
+    returns: the chosen value divided by scale and rounded to 2 decimals, or
+    NaN if it was rejected or missing.
+    """
+    extracted = extract_points(grid, [lat], [lon], rule)
+    value = float(extracted['value'][0])
+    if np.isnan(value):
+        return np.nan
+    return round(value / scale, 2)
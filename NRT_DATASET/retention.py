@@ -0,0 +1,128 @@
+import os
+import shutil
+import xarray as xr
+
+from NRT_DATASET.point_extractor import LAT_NAMES, LON_NAMES
+from NRT_DATASET.compact_granule import COMPACT_SUFFIX, granule_size, remove_granule_files
+
+# --- Retention Configuration ---
+# Downloads land here first (inside the product's data_dir, so the final
+# rename stays on one filesystem and is atomic) and are only renamed into the
+# data directory once verified and converted.
+STAGING_DIRNAME = ".staging"
+# Entries of a data directory that hold granules; anything else there (the
+# catalog, composite, time cube, state files) is never swept
+GRANULE_SUFFIXES = (COMPACT_SUFFIX, ".nc", ".nc4")
+
+
+def staging_dir(output_dir, granule_id):
+    """Returns an empty staging directory for one granule's download."""
+    path = os.path.join(output_dir, STAGING_DIRNAME, granule_id)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def clear_staging(output_dir):
+    """Removes downloads left in staging by an interrupted or failed cycle."""
+    shutil.rmtree(os.path.join(output_dir, STAGING_DIRNAME), ignore_errors=True)
+
+
+def verify_granule(nc_path, config):
+    """
+    Checks that a downloaded NetCDF file is complete enough to serve: it opens,
+    holds the product's data (and QC) variable, and the data has lat/lon axes
+    and at least one value. Raises ValueError otherwise.
+    """
+    if os.path.getsize(nc_path) == 0:
+        raise ValueError(f"{os.path.basename(nc_path)} is empty")
+    try:
+        with xr.open_datatree(nc_path) as datatree:
+            for var in (config['data_var'], config['qc_var']):
+                if var is None:
+                    continue
+                try:
+                    datatree[var]
+                except KeyError:
+                    raise ValueError(f"{os.path.basename(nc_path)} has no '{var}'")
+            data = datatree[config['data_var']]
+            if data.size == 0:
+                raise ValueError(f"'{config['data_var']}' in {os.path.basename(nc_path)} is empty")
+            if not any(n in data.coords for n in LAT_NAMES) or not any(n in data.coords for n in LON_NAMES):
+                raise ValueError(f"'{config['data_var']}' in {os.path.basename(nc_path)} has no lat/lon coordinates")
+    except OSError as e:
+        raise ValueError(f"{os.path.basename(nc_path)} cannot be read: {e}") from e
+
+
+def promote(staged_path, output_dir):
+    """
+    Moves a verified granule (file or compact directory) from staging into the
+    data directory with one atomic rename, so readers never see it half written.
+
+    Returns:
+        str: The granule's path in the data directory.
+    """
+    final_path = os.path.join(output_dir, os.path.basename(staged_path))
+    if os.path.exists(final_path):
+        # Left over from an earlier attempt and not in the catalog
+        remove_granule_files(final_path)
+    os.replace(staged_path, final_path)
+    return final_path
+
+
+def _row_size(row):
+    size = row.get('size_bytes')
+    if size is None or size != size:  # missing, or NaN in a DataFrame row
+        try:
+            size = granule_size(str(row['local_filepath']).replace('\\', '/'))
+        except OSError:
+            size = 0
+    return int(size)
+
+
+def select_retained(rows, max_granules, max_disk_mb):
+    """
+    Applies a product's retention limits to its granules.
+
+    Keeps the newest max_granules, then drops the oldest of those until their
+    total size fits the disk budget. The newest granule is always kept.
+
+    Args:
+        rows (list[dict]): Granule rows (with 'granule_id' and 'size_bytes' or
+                           'local_filepath'), newest first.
+        max_granules (int): Granule count limit.
+        max_disk_mb (float): Disk budget in MB.
+
+    Returns:
+        set: IDs of the granules to keep.
+    """
+    kept = rows[:max_granules]
+    budget = max_disk_mb * 2**20
+    total = sum(_row_size(row) for row in kept)
+    while len(kept) > 1 and total > budget:
+        total -= _row_size(kept[-1])
+        kept = kept[:-1]
+    return {row['granule_id'] for row in kept}
+
+
+def sweep_orphans(output_dir, catalog_paths):
+    """
+    Deletes granule files and unfinished conversions in a data directory that
+    the catalog does not list, e.g. left behind by a crash between promotion
+    and the catalog commit. Only call it while no ingest is promoting files
+    into this directory.
+
+    Args:
+        catalog_paths (iterable): local_filepath of every catalogued granule.
+    """
+    keep = {os.path.abspath(str(path).replace('\\', '/')) for path in catalog_paths}
+    for entry in os.scandir(output_dir):
+        path = os.path.abspath(entry.path)
+        if path in keep:
+            continue
+        if entry.name.endswith(GRANULE_SUFFIXES) or entry.name.endswith((COMPACT_SUFFIX + ".tmp", COMPACT_SUFFIX + ".old")):
+            try:
+                remove_granule_files(path)
+                print(f"   - Removed orphaned file: {entry.name}")
+            except OSError as e:
+                print(f"   - Error removing orphaned file {entry.name}: {e}")
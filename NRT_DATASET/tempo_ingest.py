@@ -0,0 +1,390 @@
+import os
+import json
+import shutil
+import argparse
+import datetime as dt
+import pandas as pd
+from harmony import BBox, Request
+import earthaccess
+
+from NRT_DATASET.earthdata_session import get_session
+from NRT_DATASET.tempo_products import PRODUCTS, INGEST_SETTINGS, SERVICE_BBOX
+from NRT_DATASET.compact_granule import TEMPO_CROP_BBOX, parse_bbox, convert_granule, remove_granule_files
+from NRT_DATASET.composite import build_composite, granule_summary
+from NRT_DATASET.time_cube import update_time_cube
+from NRT_DATASET.tile_pyramid import render_tile_pyramid
+from NRT_DATASET.granule_catalog import CATALOG_COLUMNS, list_granules, replace_granules
+from NRT_DATASET.ingest import run_granule_jobs, run_ingest_cycle
+from NRT_DATASET.retention import staging_dir, clear_staging, verify_granule, promote, select_retained, sweep_orphans
+
+# Per-product ingest state (the search high-water mark), kept next to the granule catalog
+STATE_FILENAME = "ingest_state.json"
+# Backfill runs search (and ingest) their window in slices of this many days
+BACKFILL_WINDOW_DAYS = 1
+# Compact granules are cropped to TEMPO_CROP_BBOX if set, else to the service region
+CROP_BBOX = parse_bbox(TEMPO_CROP_BBOX) or SERVICE_BBOX
+
+
+def _temporal_range(granule):
+    range_date_time = granule['umm']['TemporalExtent']['RangeDateTime']
+    return range_date_time['BeginningDateTime'], range_date_time['EndingDateTime']
+
+
+def _utc(value):
+    """Parses a timestamp (string, datetime or Timestamp) as a UTC Timestamp."""
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+
+def _granule_start(granule):
+    return _utc(_temporal_range(granule)[0])
+
+
+def read_high_water_mark(product, output_dir):
+    """
+    Returns the start time of the newest granule a product's ingest has
+    already considered, or None if it has never run.
+
+    Falls back to the newest catalogued granule for stores ingested before
+    the state file existed.
+    """
+    state_file = os.path.join(output_dir, STATE_FILENAME)
+    try:
+        with open(state_file, encoding="utf-8") as f:
+            return _utc(json.load(f)['high_water_mark'])
+    except (OSError, ValueError, KeyError):
+        pass
+    catalog_df = list_granules(product, output_dir, 1)
+    if catalog_df.empty:
+        return None
+    return _utc(catalog_df['start_time'].iloc[0])
+
+
+def write_high_water_mark(output_dir, high_water_mark):
+    state_file = os.path.join(output_dir, STATE_FILENAME)
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({'high_water_mark': high_water_mark.isoformat()}, f)
+    os.replace(tmp_file, state_file)
+
+
+def search_granules(collection_ids, start, end):
+    """
+    Searches every collection over one temporal window in a single CMR query
+    (earthaccess pages through the results) and groups the results.
+
+    Returns:
+        dict: Collection concept ID -> list of granule results, without duplicates.
+    """
+    search_args = {
+        'concept_id': sorted(collection_ids),
+        'cloud_hosted': True,
+        'temporal': (_utc(start).strftime('%Y-%m-%dT%H:%M:%SZ'), _utc(end).strftime('%Y-%m-%dT%H:%M:%SZ')),
+    }
+    if SERVICE_BBOX is not None:
+        north, south, east, west = SERVICE_BBOX
+        search_args['bounding_box'] = (west, south, east, north)
+    results = earthaccess.search_data(**search_args)
+    grouped = {collection_id: {} for collection_id in collection_ids}
+    for granule in results:
+        grouped.setdefault(granule['meta']['collection-concept-id'], {})[granule['meta']['concept-id']] = granule
+    return {collection_id: list(granules.values()) for collection_id, granules in grouped.items()}
+
+
+def search_new_granules(products, output_dirs, now=None):
+    """
+    Searches for the granules newer than each product's high-water mark.
+
+    The window starts at the oldest of the products' marks, but never before
+    search_days ago, so the query only covers what is new since the last
+    cycle however long the service has been running.
+
+    Returns:
+        dict: Product -> list of granule results starting at or after its mark.
+    """
+    now = _utc(now or dt.datetime.now(dt.timezone.utc))
+    floor = now - pd.Timedelta(days=INGEST_SETTINGS['search_days'])
+    marks = {}
+    for product in products:
+        mark = read_high_water_mark(product, output_dirs.get(product) or PRODUCTS[product]['data_dir'])
+        marks[product] = floor if mark is None else max(mark, floor)
+
+    remote = search_granules({PRODUCTS[p]['collection_id'] for p in products}, min(marks.values()), now)
+    return {
+        product: [g for g in remote.get(PRODUCTS[product]['collection_id'], []) if _granule_start(g) >= marks[product]]
+        for product in products
+    }
+
+
+def _build_request(config, granule_id):
+    options = {}
+    if config['harmony_variables']:
+        options['variables'] = config['harmony_variables']
+    if config['harmony_format']:
+        options['format'] = config['harmony_format']
+    if SERVICE_BBOX is not None:
+        # Only the service region is subset and downloaded
+        north, south, east, west = SERVICE_BBOX
+        options['spatial'] = BBox(west, south, east, north)
+    return Request(collection=get_session().collection(config['collection_id']), granule_id=granule_id, **options)
+
+
+def _ingest_granule(product, granule, harmony_client, output_dir):
+    """
+    Fetches one granule through Harmony into a staging directory, verifies
+    and converts it there, then renames it into output_dir in one step.
+
+    Returns:
+        dict | None: The granule's catalog row, or None if its request is invalid.
+    """
+    config = PRODUCTS[product]
+    granule_id = granule['meta']['concept-id']
+    start_time, end_time = _temporal_range(granule)
+
+    print(f"\nSubmitting Harmony request for {product} Granule ID: {granule_id}")
+    request = _build_request(config, granule_id)
+    if not request.is_valid():
+        print(f"Request for {granule_id} is invalid. Skipping.")
+        return None
+
+    try:
+        job_id = harmony_client.submit(request)
+        print(f"Job ID: {job_id}. Waiting for processing...")
+        harmony_client.wait_for_processing(job_id, show_progress=False)
+
+        print(f"Downloading data for Job ID: {job_id}")
+        stage = staging_dir(output_dir, granule_id)
+        results = harmony_client.download_all(job_id, directory=stage, overwrite=True)
+        filepath = [f.result() for f in results][0]
+        verify_granule(filepath, config)
+        print(f"Successfully downloaded {granule_id} to: {filepath}")
+
+        # Convert to the compact, memory-mappable form the web workers read
+        try:
+            filepath = convert_granule(filepath, config['data_var'], config['qc_var'], config['rule'], bbox=CROP_BBOX)
+            print(f"Converted to compact store: {filepath}")
+        except Exception as e:
+            print(f"Warning: Could not convert {filepath} ({e}). Keeping the NetCDF file.")
+
+        # Readers only ever see complete granules
+        filepath = promote(filepath, output_dir)
+        shutil.rmtree(stage, ignore_errors=True)
+
+        return {
+            'granule_id': granule_id,
+            'start_time': start_time,
+            'end_time': end_time,
+            'local_filepath': filepath,
+            **granule_summary(filepath, config)
+        }
+    except Exception as e:
+        print(f"An error occurred while processing granule {granule_id}: {e}")
+        raise
+
+
+def sync_product(product, new_granules, harmony_client, output_dir=None):
+    """
+    Brings one product's local granules in line with the latest ones,
+    downloading new data before old data is removed:
+
+    1. Drops the search results that are already in the catalog.
+    2. Picks the latest granules (max_granules of them) among the local and new ones.
+    3. Downloads, verifies and converts the new granules among them on the
+       shared ingest pool, each in staging until it is complete.
+    4. Only after every download succeeded, applies the product's retention
+       limits (granule count and disk budget) to the local and new granules.
+    5. Rebuilds the composite, its map tiles and the time cube, commits the catalog, then deletes
+       the files it no longer lists and advances the high-water mark.
+
+    Args:
+        product (str): A product from the product table.
+        new_granules (list): Search results newer than the product's high-water mark.
+        harmony_client (Client): The session's Harmony client.
+        output_dir (str): Where to keep data files and the catalog. Defaults to the product's.
+    """
+    config = PRODUCTS[product]
+    output_dir = output_dir or config['data_dir']
+    os.makedirs(output_dir, exist_ok=True)
+
+    # --- LOCAL STATE ---
+    current_log_df = list_granules(product, output_dir)
+    print(f"{product}: Found {len(current_log_df)} granules in the catalog.")
+    # Leftovers of an interrupted cycle never reached the catalog
+    clear_staging(output_dir)
+    sweep_orphans(output_dir, current_log_df['local_filepath'])
+    current_local_ids = set(current_log_df['granule_id'])
+    new_granules = [g for g in new_granules if g['meta']['concept-id'] not in current_local_ids]
+    high_water_mark = read_high_water_mark(product, output_dir)
+    if new_granules:
+        newest = max(_granule_start(g) for g in new_granules)
+        high_water_mark = newest if high_water_mark is None else max(high_water_mark, newest)
+
+    # --- DESIRED STATE: THE LATEST LOCAL AND NEW GRANULES ---
+    candidates = [(_utc(t), granule_id) for granule_id, t in zip(current_log_df['granule_id'], current_log_df['start_time'])]
+    candidates += [(_granule_start(g), g['meta']['concept-id']) for g in new_granules]
+    candidates.sort(reverse=True)
+    latest_ids = {granule_id for _, granule_id in candidates[:config['max_granules']]}
+    granules_to_download_meta = [g for g in new_granules if g['meta']['concept-id'] in latest_ids]
+
+    # --- DOWNLOAD NEW GRANULES FIRST ---
+    if granules_to_download_meta:
+        print(f"\n{product}: Found {len(granules_to_download_meta)} new granules to download.")
+        successfully_downloaded = run_granule_jobs(
+            lambda granule: _ingest_granule(product, granule, harmony_client, output_dir),
+            granules_to_download_meta
+        )
+        if successfully_downloaded is None:
+            return # Stop everything if a download fails; the mark stays so the next cycle retries
+    else:
+        print(f"\n{product}: No new granules to download. Local data is already up-to-date.")
+        successfully_downloaded = []
+
+    # --- RETENTION: GRANULE COUNT AND DISK BUDGET ---
+    rows = current_log_df.to_dict('records') + successfully_downloaded
+    rows.sort(key=lambda row: _utc(row['start_time']), reverse=True)
+    retained_ids = select_retained(rows, config['max_granules'], config['max_disk_mb'])
+    added_rows = [row for row in successfully_downloaded if row['granule_id'] in retained_ids]
+    removed_rows = [row for row in rows if row['granule_id'] not in retained_ids]
+    if not added_rows and not removed_rows:
+        if high_water_mark is not None:
+            write_high_water_mark(output_dir, high_water_mark)
+        return
+    print(f"{product}: Keeping {len(retained_ids)} granule(s), removing {len(removed_rows)}.")
+
+    # --- SWAP: COMMIT THE NEW CATALOG ENTRIES, THEN DELETE OLD FILES ---
+    updated_log_df = pd.DataFrame([row for row in rows if row['granule_id'] in retained_ids], columns=CATALOG_COLUMNS)
+    updated_log_df['start_time'] = pd.to_datetime(updated_log_df['start_time'], format='ISO8601')
+    updated_log_df = updated_log_df.reset_index(drop=True)
+
+    # Rebuild the best-valid-pixel composite (and its map tiles) and the time
+    # cube before the catalog change is committed
+    try:
+        build_composite(product, updated_log_df, output_dir)
+    except Exception as e:
+        print(f"Warning: Could not build the composite: {e}")
+    try:
+        render_tile_pyramid(product, output_dir)
+    except Exception as e:
+        print(f"Warning: Could not render the map tiles: {e}")
+    try:
+        update_time_cube(product, updated_log_df, output_dir)
+    except Exception as e:
+        print(f"Warning: Could not update the time cube: {e}")
+
+    replace_granules(product, output_dir, added_rows, [row['granule_id'] for row in removed_rows])
+    if high_water_mark is not None:
+        write_high_water_mark(output_dir, high_water_mark)
+    print(f"\n{product}: The granule catalog has been successfully updated.")
+
+    # Readers of the previous revision keep their mapped files readable; where a
+    # mapped file cannot be deleted (Windows), the next cycle's sweep retries
+    if removed_rows:
+        print(f"Cleaning up {len(removed_rows)} old granule file(s)...")
+        for row in removed_rows:
+            old_filepath = str(row['local_filepath']).replace('\\', '/')
+            try:
+                if os.path.exists(old_filepath):
+                    remove_granule_files(old_filepath)
+                    print(f"   - Deleted: {os.path.basename(old_filepath)}")
+                else:
+                    print(f"   - Warning: File not found, cannot delete: {old_filepath}")
+            except Exception as e:
+                print(f"   - Error deleting file {old_filepath}: {e}")
+
+
+def backfill_product(product, start, end, output_dir):
+    """
+    Ingests every granule of a product between start and end into a separate
+    archive directory, one BACKFILL_WINDOW_DAYS slice at a time. Granules
+    already in the archive's catalog are skipped, so an interrupted run can simply
+    be repeated. Nothing is deleted and the live store's high-water mark is
+    not touched.
+
+    Args:
+        product (str): A product from the product table.
+        start, end: The window to backfill (strings or datetimes, UTC if naive).
+        output_dir (str): The archive directory; must not be the product's live data directory.
+    """
+    config = PRODUCTS[product]
+    if os.path.abspath(output_dir) == os.path.abspath(config['data_dir']):
+        raise ValueError("Backfill into the live data directory would be undone by the next cycle.")
+    os.makedirs(output_dir, exist_ok=True)
+    clear_staging(output_dir)
+
+    harmony_client = get_session().harmony_client()
+    if harmony_client is None:
+        return
+
+    window_start, end = _utc(start), _utc(end)
+    while window_start < end:
+        window_end = min(window_start + pd.Timedelta(days=BACKFILL_WINDOW_DAYS), end)
+        known_ids = set(list_granules(product, output_dir)['granule_id'])
+        granules = [
+            g for g in search_granules({config['collection_id']}, window_start, window_end)[config['collection_id']]
+            if g['meta']['concept-id'] not in known_ids and window_start <= _granule_start(g) < window_end
+        ]
+        print(f"\n{product}: {len(granules)} granules to backfill for {window_start:%Y-%m-%d %H:%M} - {window_end:%Y-%m-%d %H:%M}.")
+
+        if granules:
+            rows = run_granule_jobs(lambda granule: _ingest_granule(product, granule, harmony_client, output_dir), granules)
+            if rows is None:
+                print(f"{product}: Backfill stopped; repeat the run to resume from this window.")
+                return
+            replace_granules(product, output_dir, rows)
+        window_start = window_end
+
+
+def fetch_products(products=None, output_dirs=None):
+    """
+    Runs one ingest cycle: a single search across all the products'
+    collections for what is newer than their high-water marks, then every
+    product synced concurrently. The Earthdata login and Harmony client come
+    from the long-lived session, so they are only set up again when the
+    token is about to expire.
+
+    Args:
+        products (list[str]): Products to fetch. Defaults to the whole product table.
+        output_dirs (dict): Optional product -> output directory overrides.
+    """
+    products = products or list(PRODUCTS)
+    output_dirs = output_dirs or {}
+
+    session = get_session()
+    try:
+        harmony_client = session.harmony_client()
+        if harmony_client is None:
+            return
+        for product in products:
+            collection = session.collection_metadata(PRODUCTS[product]['collection_id'])
+            if collection is None:
+                print(f"{product}: Collection {PRODUCTS[product]['collection_id']} not found in CMR.")
+        new_granules = search_new_granules(products, output_dirs)
+    except Exception as e:
+        # A transient URS/CMR error or an expired login; start afresh next cycle
+        print(f"Ingest cycle failed before syncing: {e}")
+        session.invalidate()
+        return
+
+    run_ingest_cycle({
+        product: (lambda product=product: sync_product(
+            product, new_granules[product], harmony_client, output_dirs.get(product)))
+        for product in products
+    })
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Ingest the latest TEMPO granules, or backfill a past window.")
+    arg_parser.add_argument("--products", nargs="+", choices=list(PRODUCTS), help="Products (default: all)")
+    arg_parser.add_argument("--backfill", nargs=2, metavar=("START", "END"), help="Backfill this UTC window instead")
+    arg_parser.add_argument("--output", help="Archive directory for --backfill (one subdirectory per product)")
+    args = arg_parser.parse_args()
+
+    if args.backfill:
+        if not args.output:
+            arg_parser.error("--backfill needs --output")
+        for product in args.products or list(PRODUCTS):
+            backfill_product(product, *args.backfill, os.path.join(args.output, product))
+    else:
+        print("--- Starting TEMPO Ingest ---")
+        fetch_products(args.products)
+        print("\n--- TEMPO Ingest Finished ---")
@@ -0,0 +1,72 @@
+import os
+import json
+
+from NRT_DATASET.point_extractor import RULE_QC_MASKED, RULE_VARIABILITY
+
+# --- Product Table ---
+# One entry per served product: which TEMPO collection it is fetched from
+# (release + collection, resolved against the catalog from tempo_collection_id.txt),
+# what Harmony should subset, and how points are extracted from it.
+TEMPO_PRODUCTS_CONFIG = os.environ.get("TEMPO_PRODUCTS_CONFIG", "./config/tempo_products.json")
+
+
+def load_product_table(path=TEMPO_PRODUCTS_CONFIG):
+    """
+    Reads the product table and resolves each product's collection concept ID
+    and retention limits (granule count and disk budget, defaulting to the
+    ingest settings).
+
+    Returns:
+        tuple: (products dict keyed by product name, ingest settings dict)
+    """
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+
+    products = {}
+    for name, config in table['products'].items():
+        if config['rule'] not in (RULE_QC_MASKED, RULE_VARIABILITY):
+            raise ValueError(f"Unknown point extraction rule for {name}: {config['rule']}")
+        try:
+            collection_id = table['collections'][config['release']][config['collection']]
+        except KeyError:
+            raise ValueError(f"No {config['release']} collection '{config['collection']}' for {name}")
+        products[name] = dict(
+            config,
+            collection_id=collection_id,
+            max_granules=config.get('max_granules', table['ingest']['max_granules']),
+            max_disk_mb=config.get('max_disk_mb', table['ingest']['max_disk_mb']),
+        )
+        # The composite indexes its source granules with an int8
+        if not 1 <= products[name]['max_granules'] <= 127:
+            raise ValueError(f"max_granules for {name} must be between 1 and 127")
+    return products, table['ingest']
+
+
+def service_bbox(regions, margin_deg=0.0):
+    """
+    The smallest box enclosing every service region, widened by margin_deg.
+
+    Args:
+        regions (list[dict]): Boxes with 'north', 'south', 'east' and 'west' in degrees.
+        margin_deg (float): Added on every side, so neighbourhoods at the edge stay complete.
+
+    Returns:
+        tuple | None: (north, south, east, west), or None if there are no
+                      regions (the full TEMPO field of regard is served).
+    """
+    if not regions:
+        return None
+    for region in regions:
+        if region['north'] <= region['south'] or region['east'] <= region['west']:
+            raise ValueError(f"Invalid service region: {region}")
+    return (
+        round(min(max(r['north'] for r in regions) + margin_deg, 90.0), 6),
+        round(max(min(r['south'] for r in regions) - margin_deg, -90.0), 6),
+        round(min(max(r['east'] for r in regions) + margin_deg, 180.0), 6),
+        round(max(min(r['west'] for r in regions) - margin_deg, -180.0), 6),
+    )
+
+
+PRODUCTS, INGEST_SETTINGS = load_product_table()
+# Where our schools are: Harmony subsets to this box and the ingest crops to it
+SERVICE_BBOX = service_bbox(INGEST_SETTINGS.get('service_region', []), INGEST_SETTINGS.get('service_margin_deg', 0.0))
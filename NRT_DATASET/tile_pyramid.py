@@ -0,0 +1,160 @@
+import os
+import json
+import math
+import shutil
+import numpy as np
+import matplotlib
+from matplotlib import image as mpimg
+
+from NRT_DATASET.granule_store import PRODUCTS, INGEST_SETTINGS
+from NRT_DATASET.compact_granule import load_composite, swap_directory, current_directory
+from NRT_DATASET.point_extractor import nearest_index, within_axis
+
+# --- Tile Pyramid Configuration ---
+# XYZ (Web Mercator) PNG tiles of each product's composite, rendered at ingest
+# into <data_dir>/tiles/<z>/<x>/<y>.png so the map layer is served as static files.
+TILES_DIRNAME = "tiles"
+TILE_SIZE = 256
+MIN_ZOOM, MAX_ZOOM = INGEST_SETTINGS['tile_zooms']
+EMPTY_TILE = "empty.png" # Served for tiles inside the pyramid with no data
+MAX_MERCATOR_LAT = 85.0511287798
+# Fast zlib level: tiles are rewritten every cycle, and size barely differs for smooth fields
+PNG_OPTIONS = {"compress_level": 1}
+
+
+def _tile_range(low, high, n, to_unit):
+    """Indices of the tiles (out of n) spanned by [low, high] along one axis."""
+    a, b = sorted((to_unit(low), to_unit(high)))
+    return range(max(int(math.floor(a * n)), 0), min(int(math.floor(b * n)), n - 1) + 1)
+
+
+def _lon_to_unit(lon):
+    return (lon + 180.0) / 360.0
+
+
+def _lat_to_unit(lat):
+    lat = math.radians(max(min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT))
+    return (1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0
+
+
+def _pixel_lons(x, n):
+    px = x * TILE_SIZE + np.arange(TILE_SIZE) + 0.5
+    return px / (TILE_SIZE * n) * 360.0 - 180.0
+
+
+def _pixel_lats(y, n):
+    py = y * TILE_SIZE + np.arange(TILE_SIZE) + 0.5
+    return np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * py / (TILE_SIZE * n)))))
+
+
+def _axis_lookup(axis, step, targets):
+    """Nearest composite index for each target and whether it lies on the grid at all."""
+    return nearest_index(axis, targets, step), within_axis(axis, targets, step)
+
+
+def _colour_table(tiles_config):
+    """The colormap as a 256-entry RGBA lookup table; rendering only indexes it."""
+    return matplotlib.colormaps[tiles_config['colormap']](np.linspace(0.0, 1.0, 256), bytes=True)
+
+
+def _colorize(values, lut, tiles_config, scale):
+    """RGBA bytes for scaled values; NaN (no good pixel) is transparent."""
+    with np.errstate(invalid="ignore"):
+        norm = (values / scale - tiles_config['vmin']) / (tiles_config['vmax'] - tiles_config['vmin'])
+    rgba = lut[np.rint(np.clip(np.nan_to_num(norm), 0.0, 1.0) * 255).astype(np.uint8)]
+    rgba[..., 3] = np.where(np.isfinite(values), 255, 0)
+    return rgba
+
+
+def render_tile_pyramid(product, data_dir=None, zooms=(MIN_ZOOM, MAX_ZOOM)):
+    """
+    Renders the product's composite into an XYZ PNG tile pyramid. Tiles
+    without any good pixel are not written; the route serves EMPTY_TILE for
+    them. The pyramid is written under a temporary name and swapped in, so
+    the tile route never serves a mix of two composites.
+
+    Args:
+        product (str): One of PRODUCTS ('NO2', 'HCHO', 'O3').
+        data_dir (str): The product's data directory. Defaults to the product's.
+        zooms (tuple): Lowest and highest zoom level to render.
+
+    Returns:
+        str | None: Path of the tiles directory, or None if there is no composite.
+    """
+    config = PRODUCTS[product]
+    data_dir = data_dir or config['data_dir']
+    composite = load_composite(data_dir)
+    if composite is None:
+        return None
+    lat, lon, value = composite['lat'], composite['lon'], composite['value']
+
+    out_dir = os.path.join(data_dir, TILES_DIRNAME)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    mpimg.imsave(os.path.join(tmp_dir, EMPTY_TILE), np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+    lut = _colour_table(config['tiles'])
+    written = 0
+    for z in range(zooms[0], zooms[1] + 1):
+        n = 2 ** z
+        for x in _tile_range(lon[0], lon[-1], n, _lon_to_unit):
+            j, lon_inside = _axis_lookup(lon, composite['lon_step'], _pixel_lons(x, n))
+            if not lon_inside.any():
+                continue
+            for y in _tile_range(lat[0], lat[-1], n, _lat_to_unit):
+                i, lat_inside = _axis_lookup(lat, composite['lat_step'], _pixel_lats(y, n))
+                if not lat_inside.any():
+                    continue
+                tile = np.asarray(value[np.ix_(i, j)], dtype=float)
+                tile[~np.outer(lat_inside, lon_inside)] = np.nan
+                if not np.isfinite(tile).any():
+                    continue
+                tile_dir = os.path.join(tmp_dir, str(z), str(x))
+                os.makedirs(tile_dir, exist_ok=True)
+                mpimg.imsave(os.path.join(tile_dir, f"{y}.png"), _colorize(tile, lut, config['tiles'], config['scale']),
+                             pil_kwargs=PNG_OPTIONS)
+                written += 1
+
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({
+            'product': product,
+            'min_zoom': zooms[0],
+            'max_zoom': zooms[1],
+            'bounds': [float(lat[0]), float(lon[0]), float(lat[-1]), float(lon[-1])],
+            'colormap': config['tiles']['colormap'],
+            'vmin': config['tiles']['vmin'],
+            'vmax': config['tiles']['vmax'],
+            'granules': composite['granules'],
+        }, f)
+
+    swap_directory(tmp_dir, out_dir)
+    print(f"Rendered {product} tile pyramid: {written} tile(s), zoom {zooms[0]}-{zooms[1]}.")
+    return out_dir
+
+
+def tile_file(product, z, x, y, data_dir=None):
+    """
+    Path of a pre-rendered tile: the tile itself, EMPTY_TILE for a tile inside
+    the pyramid's zoom range without data, or None outside it (or before the
+    first rendering).
+    """
+    tiles_dir = current_directory(os.path.join(data_dir or PRODUCTS[product]['data_dir'], TILES_DIRNAME))
+    path = os.path.join(tiles_dir, str(z), str(x), f"{y}.png")
+    if os.path.exists(path):
+        return path
+    if MIN_ZOOM <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z:
+        empty = os.path.join(tiles_dir, EMPTY_TILE)
+        return empty if os.path.exists(empty) else None
+    return None
+
+
+def tile_meta(product, data_dir=None):
+    """The pyramid's meta.json (bounds, zoom range, colour scale, source granules), or None."""
+    tiles_dir = current_directory(os.path.join(data_dir or PRODUCTS[product]['data_dir'], TILES_DIRNAME))
+    meta_file = os.path.join(tiles_dir, "meta.json")
+    try:
+        with open(meta_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
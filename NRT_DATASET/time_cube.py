@@ -0,0 +1,96 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from NRT_DATASET.granule_store import PRODUCTS, INGEST_SETTINGS, load_grid, normalize_path
+from NRT_DATASET.compact_granule import TIME_CUBE_DIRNAME, load_time_cube, swap_directory
+from NRT_DATASET.composite import good_pixel_mask
+
+# Hourly scans kept in each product's rolling cube. Unlike the granule files,
+# which only go back max_granules scans, the cube keeps this many.
+CUBE_SCANS = INGEST_SETTINGS['cube_scans']
+
+
+def _same_axes(a, b):
+    return (a['lat'].shape == b['lat'].shape and a['lon'].shape == b['lon'].shape
+            and np.allclose(a['lat'], b['lat']) and np.allclose(a['lon'], b['lon']))
+
+
+def _scan_slice(grid, config):
+    """A granule's good pixels (NaN elsewhere), as one float32 time slice."""
+    return np.where(good_pixel_mask(grid, config), np.asarray(grid['values'], dtype=np.float32), np.nan).astype(np.float32)
+
+
+def update_time_cube(product, log_df, data_dir=None, scans=CUBE_SCANS):
+    """
+    Adds the granules of the new catalog rows to the product's rolling time
+    cube, keeping the latest `scans` of them stacked along time (oldest first).
+    Scans already in the cube are reused from it, so only the new granules are
+    read; if the grid changed, the cube starts over. Call it before committing
+    the granules to the catalog, like build_composite.
+
+    Args:
+        product (str): One of PRODUCTS ('NO2', 'HCHO', 'O3').
+        log_df (pd.DataFrame): The new catalog rows, newest granule first.
+        data_dir (str): The product's data directory. Defaults to the product's.
+        scans (int): How many scans the cube keeps.
+
+    Returns:
+        str | None: Path of the cube directory, or None if there is nothing to stack.
+    """
+    config = PRODUCTS[product]
+    data_dir = data_dir or config['data_dir']
+    previous = load_time_cube(data_dir)
+    previous_ids = {} if previous is None else {g['granule_id']: k for k, g in enumerate(previous['granules'])}
+
+    # Entries: (start_time, granule meta, loader of its time slice)
+    entries = {}
+    reference = None
+    for _, row in log_df.iterrows():
+        if row['granule_id'] in previous_ids:
+            continue
+        grid = load_grid(normalize_path(row['local_filepath']), config)[2]
+        if reference is None:
+            reference = grid
+        elif not _same_axes(reference, grid):
+            print(f"Warning: {product} granule {row['granule_id']} is on a different grid; left out of the time cube.")
+            continue
+        meta = {'granule_id': row['granule_id'], 'start_time': str(row['start_time']), 'end_time': str(row['end_time'])}
+        entries[row['granule_id']] = (pd.Timestamp(row['start_time']), meta, lambda grid=grid: _scan_slice(grid, config))
+
+    if previous is not None and (reference is None or _same_axes(reference, previous)):
+        if reference is None:
+            reference = previous
+        for granule_id, k in previous_ids.items():
+            if granule_id not in entries:
+                meta = previous['granules'][k]
+                entries[granule_id] = (pd.Timestamp(meta['start_time']), meta, lambda k=k: previous['values'][k])
+    elif previous is not None:
+        print(f"{product} grid changed; starting a new time cube.")
+
+    if not entries:
+        return None
+    kept = sorted(entries.values(), key=lambda entry: entry[0])[-scans:]
+    out_dir = os.path.join(data_dir, TIME_CUBE_DIRNAME)
+    if previous is not None and [meta['granule_id'] for _, meta, _ in kept] == [g['granule_id'] for g in previous['granules']]:
+        return out_dir # Nothing new to stack
+
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    shape = (len(kept), len(reference['lat']), len(reference['lon']))
+    values = np.lib.format.open_memmap(os.path.join(tmp_dir, "values.npy"), mode="w+", dtype=np.float32, shape=shape)
+    for k, (_, _, load_slice) in enumerate(kept):
+        values[k] = load_slice()
+    values.flush()
+    del values
+    np.save(os.path.join(tmp_dir, "lat.npy"), reference['lat'])
+    np.save(os.path.join(tmp_dir, "lon.npy"), reference['lon'])
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({'product': product, 'granules': [meta for _, meta, _ in kept]}, f)
+
+    swap_directory(tmp_dir, out_dir)
+    print(f"Updated {product} time cube: {len(kept)} scan(s).")
+    return out_dir
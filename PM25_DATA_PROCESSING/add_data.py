@@ -5,38 +5,16 @@ import rasterio
 from shapely.ops import nearest_points
 from osmnx import _errors
 import os
-import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import sys
 
-# --- Geospatial and Elevation Functions (same as before) ---
+# Make the repository root importable when this script is run directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fetch_forecast.raster_sampler import get_raster_sampler
+from fetch_forecast.elevation import get_elevation
 
-def get_altitude(lat, lon):
-    """Get altitude from the Open-Meteo Elevation API."""
-    url = "https://api.open-meteo.com/v1/elevation"
-    params = {
-        "latitude": lat,
-        "longitude": lon
-    }
-    try:
-        response = requests.get(url, params=params, timeout=20)
-        response.raise_for_status()  # Raise an exception for HTTP errors (e.g., 404, 500)
-        
-        data = response.json()
-        
-        # The API returns a list with a single elevation value
-        elevation = data.get("elevation")
-        if elevation and isinstance(elevation, list):
-            return elevation[0]
-        else:
-            raise ValueError("Invalid data format received from API.")
-
-    except requests.exceptions.RequestException as e:
-        print(f"Network error fetching altitude for ({lat}, {lon}): {e}")
-        return None
-    except (ValueError, KeyError) as e:
-        print(f"Error processing response for ({lat}, {lon}): {e}")
-        return None
+# --- Geospatial and Elevation Functions (same as before) ---
 
 def get_nasa_population_density(lat, lon, tif_path):
     """Fetches population density from a local GeoTIFF file."""
@@ -44,9 +22,9 @@ def get_nasa_population_density(lat, lon, tif_path):
         # This warning is expected if the file isn't present
         return None
     try:
-        with rasterio.open(tif_path) as src:
-            value = next(src.sample([(lon, lat)]))[0]
-            return round(float(value), 2) if value >= 0 else 0.0
+        # Shared sampler: the raster is opened once, not once per row
+        value = get_raster_sampler(tif_path).sample([lat], [lon])[0]
+        return round(float(value), 2) if value >= 0 else 0.0
     except (IndexError, rasterio.errors.RasterioIOError) as e:
         print(f"Error reading population data for ({lat}, {lon}): {e}")
         return None
@@ -89,7 +67,7 @@ def get_geospatial_features(lat, lon, tif_path):
         'road': round(distance_to_road, 2),
         'industrial': round(distance_to_industrial, 2),
         'population': get_nasa_population_density(lat, lon, tif_path),
-        'elev': get_altitude(lat, lon, )
+        'elev': get_elevation(lat, lon)
     }
 
 def process_row(index, row, tif_path):
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, render_template
+from flask import Flask, jsonify, render_template, send_file
 import json
 import random
 from datetime import datetime, timedelta
@@ -7,14 +7,15 @@ import requests
 from datetime import datetime
 import pytz
 from timezonefinder import TimezoneFinder
-from NRT_DATASET.HCHO.data_fetcher import fetch_and_manage_tempo_hcho_granules
-from NRT_DATASET.NO2.data_fetcher import fetch_and_manage_tempo_no2_granules
-from NRT_DATASET.O3.data_fetcher import fetch_and_manage_tempo_o3_granules
+from NRT_DATASET.tempo_ingest import fetch_products
+from NRT_DATASET.granule_store import get_point_series, PRODUCTS as TEMPO_PRODUCTS
+from NRT_DATASET.tile_pyramid import tile_file, tile_meta
 from NRT_DATASET.HCHO.point_value import get_hcho_value
 from NRT_DATASET.NO2.point_value import get_no2_value
 from NRT_DATASET.O3.point_value import get_o3_value
 from NRT_DATASET.PM25.point_value import get_pm25_value
-from fetch_forecast.fetch_all_forecast_data import predict_data
+from fetch_forecast.fetch_all_forecast_data import predict_all_pollutants
+from MODEL.model_registry import preload_models
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from waitress import serve
@@ -29,6 +30,8 @@ app = Flask(__name__)
 # In a production environment, use a more complex, securely stored key.
 app.secret_key = os.urandom(24)
 GEOAPIFY_KEY = os.environ.get("GEOAPIFY_KEY")
+# Seconds between TEMPO ingest cycles; the Earthdata session persists across them
+TEMPO_POLL_SECONDS = int(os.environ.get("TEMPO_POLL_SECONDS", "1200"))
 
 
 LATITUDE = 38.89511 #WASHINGTON DC
@@ -85,11 +88,15 @@ def before_request_handler():
 def background_tasks():
     """A function to run our fetching tasks on a loop."""
     while True:
-        time.sleep(1200)
+        time.sleep(TEMPO_POLL_SECONDS)
         print("Running background data fetch...")
-        fetch_and_manage_tempo_o3_granules()
-        fetch_and_manage_tempo_hcho_granules()
-        fetch_and_manage_tempo_no2_granules()
+        # One search for every product in config/tempo_products.json over the shared
+        # Earthdata session; the products ingest concurrently on one bounded pool
+        try:
+            fetch_products()
+        except Exception as e:
+            # A failed cycle must not end the loop; the next poll tries again
+            print(f"Background data fetch failed: {e}")
         # Wait for an hour (3600 seconds) before running again
         
 def convert_coordinates(lat, lon):
@@ -430,6 +437,9 @@ def load_json_file(filename):
 schedule_data = load_json_file('./config/schedule.json')
 recommendation_data = load_json_file('./config/recommendations.json')
 
+# Load the forecast models once so request threads share them
+preload_models()
+
 @app.route('/')
 def index():
     """ Renders the main HTML page. """
@@ -610,45 +620,41 @@ def air_quality_data(mode, latitude, longitude):
             
             # PM2.5 tasks
             pm25_data_future = executor.submit(get_pm25_value, lat, lon)
-            pm25_forecast_future = executor.submit(predict_data, './MODEL/pm25_model.joblib', './MODEL/pm25_scalar.joblib', lat, lon, './MODEL/pm25.tif', './MODEL/pm25.gpkg')
 
             # NO2 tasks
             no2_data_future = executor.submit(get_no2_value, lat, lon)
-            no2_forecast_future = executor.submit(predict_data, './MODEL/no2_model.joblib', './MODEL/no2_scalar.joblib', lat, lon, './MODEL/no2.tif', './MODEL/no2.gpkg')
 
             # O3 tasks
             o3_data_future = executor.submit(get_o3_value, lat, lon)
-            o3_forecast_future = executor.submit(predict_data, './MODEL/o3_model.joblib', './MODEL/o3_scalar.joblib', lat, lon, './MODEL/o3.tif', './MODEL/o3.gpkg')
 
             # HCHO tasks
             hcho_data_future = executor.submit(get_hcho_value, lat, lon)
-            hcho_forecast_future = executor.submit(predict_data, './MODEL/hcho_model.joblib', './MODEL/hcho_scalar.joblib', lat, lon, './MODEL/hcho.tif', './MODEL/hcho.gpkg')
+
+            # Forecast task: the shared features are built once for all four models
+            forecast_future = executor.submit(predict_all_pollutants, lat, lon)
 
             # --- RETRIEVE THE RESULTS ---
             # Now, we call .result() on each Future object. This will wait for the
             # specific task to finish and give you its return value. Since they all
             # ran in parallel, you're only waiting for the longest one to complete.
+            forecast_results = forecast_future.result()
 
             # PM2.5 results
             pm25_data, pm25_unit = pm25_data_future.result()
-            pm25_forecast_data = pm25_forecast_future.result()
-            pm25_forecast_data = json.loads(pm25_forecast_data)
+            pm25_forecast_data = json.loads(forecast_results['pm25'])
             print(pm25_forecast_data)
             
             # NO2 results
             no2_data, no2_instrument, no2_unit = no2_data_future.result()
-            no2_forecast_data = no2_forecast_future.result()
-            no2_forecast_data = json.loads(no2_forecast_data)
+            no2_forecast_data = json.loads(forecast_results['no2'])
 
             # O3 results
             o3_data, o3_instrument, o3_unit = o3_data_future.result()
-            o3_forecast_data = o3_forecast_future.result()
-            o3_forecast_data = json.loads(o3_forecast_data)
+            o3_forecast_data = json.loads(forecast_results['o3'])
 
             # HCHO results
             hcho_data, hcho_instrument, hcho_unit = hcho_data_future.result()
-            hcho_forecast_data = hcho_forecast_future.result()
-            hcho_forecast_data = json.loads(hcho_forecast_data)
+            hcho_forecast_data = json.loads(forecast_results['hcho'])
 
             update_user_forecast_data(
                 pm25_forecast=pm25_forecast_data,
@@ -915,6 +921,48 @@ def weather_data(latitude, longitude):
         # Handle missing keys or unexpected structure in the API response
         return jsonify({"error": f"Error parsing weather data: {e}"}), 500
 
+@app.route('/api/tempo-series/<product>/<latitude>/<longitude>')
+def tempo_series(product, latitude, longitude):
+    """Provides the intraday evolution of a TEMPO product at a location, one value per hourly scan."""
+    product = product.upper()
+    if product not in TEMPO_PRODUCTS:
+        return jsonify({"error": f"Unknown TEMPO product '{product}'."}), 404
+    latitude = parse_coordinate(latitude)
+    longitude = parse_coordinate(longitude)
+
+    # One read from the rolling time cube instead of opening every granule
+    series = get_point_series(product, [latitude], [longitude])
+    if series is None:
+        return jsonify({"error": f"No {product} time cube available yet."}), 503
+    return jsonify({
+        "product": product,
+        "times": [str(t) + "Z" for t in series['time']],
+        "values": [None if math.isnan(v) else v for v in series['value'][0].tolist()],
+    })
+
+@app.route('/api/tiles/<product>/<int:z>/<int:x>/<int:y>.png')
+def tempo_tile(product, z, x, y):
+    """Serves a pre-rendered XYZ map tile of a TEMPO product's latest composite."""
+    product = product.upper()
+    if product not in TEMPO_PRODUCTS:
+        return jsonify({"error": f"Unknown TEMPO product '{product}'."}), 404
+    path = tile_file(product, z, x, y)
+    if path is None:
+        return jsonify({"error": "Tile not available."}), 404
+    # Static file read; the ETag lets browsers revalidate with a 304 until the next ingest
+    return send_file(os.path.abspath(path), mimetype='image/png', conditional=True, etag=True, max_age=TEMPO_POLL_SECONDS)
+
+@app.route('/api/tiles/<product>/meta')
+def tempo_tile_meta(product):
+    """Provides a TEMPO tile layer's bounds, zoom range and colour scale for the map legend."""
+    product = product.upper()
+    if product not in TEMPO_PRODUCTS:
+        return jsonify({"error": f"Unknown TEMPO product '{product}'."}), 404
+    meta = tile_meta(product)
+    if meta is None:
+        return jsonify({"error": f"No {product} tiles rendered yet."}), 503
+    return jsonify(meta)
+
 @app.route('/api/notifications')
 def get_notifications():
     """
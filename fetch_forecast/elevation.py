@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import requests
+from fetch_forecast.raster_sampler import get_raster_sampler
+
+# --- Elevation Configuration ---
+# Local DEM in EPSG:4326 (e.g. Copernicus GLO-90, the DEM behind Open-Meteo's elevation API)
+DEM_PATH = os.environ.get("DEM_PATH", "./MODEL/elevation.tif")
+# Use the Open-Meteo elevation API for points the DEM cannot answer
+ELEVATION_API_FALLBACK = os.environ.get("ELEVATION_API_FALLBACK", "1") == "1"
+ELEVATION_API_URL = "https://api.open-meteo.com/v1/elevation"
+ELEVATION_BATCH_SIZE = 100 # Max coordinates per Open-Meteo elevation request
+
+
+def get_altitude(lat, lon):
+    """Get altitude from the Open-Meteo Elevation API."""
+    params = {"latitude": lat, "longitude": lon}
+    try:
+        response = requests.get(ELEVATION_API_URL, params=params, timeout=20)
+        response.raise_for_status()
+        data = response.json()
+        elevation = data.get("elevation")
+        if elevation and isinstance(elevation, list):
+            return elevation[0]
+        else:
+            raise ValueError("Invalid data format received from elevation API.")
+    except requests.exceptions.RequestException as e:
+        print(f"Network error fetching altitude for ({lat}, {lon}): {e}")
+        return None
+    except (ValueError, KeyError) as e:
+        print(f"Error processing elevation response for ({lat}, {lon}): {e}")
+        return None
+
+
+def fetch_open_meteo_elevations(lats, lons):
+    """Fetches elevations from Open-Meteo in batches. Failed batches are left as NaN."""
+    elevations = np.full(len(lats), np.nan)
+    for start in range(0, len(lats), ELEVATION_BATCH_SIZE):
+        stop = start + ELEVATION_BATCH_SIZE
+        params = {
+            "latitude": ",".join(f"{lat:.4f}" for lat in lats[start:stop]),
+            "longitude": ",".join(f"{lon:.4f}" for lon in lons[start:stop]),
+        }
+        try:
+            response = requests.get(ELEVATION_API_URL, params=params, timeout=20)
+            response.raise_for_status()
+            elevations[start:stop] = response.json().get("elevation", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching elevation batch starting at {start}: {e}")
+    return elevations
+
+
+def get_elevations(lats, lons, dem_path=DEM_PATH, allow_fallback=ELEVATION_API_FALLBACK):
+    """
+    Vectorized elevation lookup in meters.
+
+    Points are sampled from the local DEM; points outside it or on nodata
+    pixels are sent to the Open-Meteo elevation API when allow_fallback is set.
+
+    Args:
+        lats (array-like): Latitudes of the points.
+        lons (array-like): Longitudes of the points.
+        dem_path (str): Path to the DEM GeoTIFF.
+        allow_fallback (bool): Query Open-Meteo for points the DEM cannot answer.
+
+    Returns:
+        np.ndarray: Elevation per point, NaN where none could be found.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    elevations = np.full(lats.shape, np.nan)
+
+    if os.path.exists(dem_path):
+        elevations = np.round(get_raster_sampler(dem_path).sample(lats, lons), 1)
+
+    missing = np.flatnonzero(np.isnan(elevations))
+    if allow_fallback and len(missing) > 0:
+        elevations[missing] = fetch_open_meteo_elevations(lats[missing], lons[missing])
+    return elevations
+
+
+def get_elevation(lat, lon, dem_path=DEM_PATH, allow_fallback=ELEVATION_API_FALLBACK):
+    """Single-point version of get_elevations. Returns None when no elevation is found."""
+    if not os.path.exists(dem_path):
+        # Keep the single-point API call (and its error messages) when no DEM is installed
+        return get_altitude(lat, lon) if allow_fallback else None
+
+    value = get_elevations([lat], [lon], dem_path, allow_fallback)[0]
+    return None if np.isnan(value) else float(value)
@@ -0,0 +1,178 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+
+# --- Cache Configuration ---
+FEATURE_CACHE_PATH = os.environ.get("FEATURE_CACHE_PATH", "./fetch_forecast/feature_cache.sqlite")
+# Tile edge in degrees; 0.001° is roughly 100 m, far below the feature resolution.
+FEATURE_CACHE_TILE_DEG = float(os.environ.get("FEATURE_CACHE_TILE_DEG", "0.001"))
+FEATURE_CACHE_MAX_ENTRIES = int(os.environ.get("FEATURE_CACHE_MAX_ENTRIES", "50000"))
+# Bump when the way features are computed changes, to invalidate old entries.
+FEATURE_SCHEMA_VERSION = "1"
+# A hit only rewrites an entry's last_access when it is older than this, so
+# most reads stay read-only; LRU eviction does not need finer timestamps.
+LAST_ACCESS_RESOLUTION_SECONDS = 300
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+_checksums = {}  # (path, mtime, size) -> sha256 hex digest
+_checksum_lock = threading.Lock()
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_cache_stats():
+    """Returns the hit/miss counters of this process and the current entry count."""
+    with _stats_lock:
+        stats = dict(_stats)
+    try:
+        with closing(_connect()) as conn, conn:
+            stats["entries"] = conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    except sqlite3.Error:
+        stats["entries"] = None
+    return stats
+
+
+def _connect(cache_path=None):
+    """Opens a connection to the cache, creating the schema on first use."""
+    cache_path = cache_path or FEATURE_CACHE_PATH
+    conn = sqlite3.connect(cache_path, timeout=10)
+    if cache_path not in _initialized_paths:
+        with _init_lock:
+            if cache_path not in _initialized_paths:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS features (
+                        tile_key TEXT PRIMARY KEY,
+                        version TEXT NOT NULL,
+                        data TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_features_last_access ON features (last_access)")
+                conn.commit()
+                _initialized_paths.add(cache_path)
+    return conn
+
+
+def _file_checksum(path):
+    """
+    SHA-256 of a source file, computed once per file version. Concurrent
+    first requests wait for one hash instead of each reading the file.
+    """
+    if not path or not os.path.exists(path):
+        return "missing"
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    digest = _checksums.get(key)
+    if digest is not None:
+        return digest
+    with _checksum_lock:
+        digest = _checksums.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            _checksums[key] = digest
+    return digest
+
+
+def get_source_version(*source_paths):
+    """Builds the cache version string from the checksums of the source GPKG/TIF files."""
+    sha = hashlib.sha256(FEATURE_SCHEMA_VERSION.encode())
+    for path in source_paths:
+        sha.update(_file_checksum(path).encode())
+    return sha.hexdigest()[:16]
+
+
+def tile_key(lat, lon, tile_deg=None):
+    """Quantizes a coordinate to the tile that contains it."""
+    tile_deg = tile_deg or FEATURE_CACHE_TILE_DEG
+    return f"{math.floor(lat / tile_deg)}:{math.floor(lon / tile_deg)}"
+
+
+def get_cached_features(lat, lon, version):
+    """Returns the cached feature dict for a point's tile, or None on a miss."""
+    key = tile_key(lat, lon)
+    try:
+        with closing(_connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT data, last_access FROM features WHERE tile_key = ? AND version = ?", (key, version)
+            ).fetchone()
+            now = time.time()
+            if row is not None and now - row[1] > LAST_ACCESS_RESOLUTION_SECONDS:
+                conn.execute("UPDATE features SET last_access = ? WHERE tile_key = ?", (now, key))
+    except sqlite3.Error as e:
+        print(f"Feature cache read failed for ({lat}, {lon}): {e}")
+        row = None
+
+    if row is None:
+        _count("misses")
+        return None
+    _count("hits")
+    return json.loads(row[0])
+
+
+def store_features(lat, lon, version, features):
+    """Stores a feature dict for a point's tile and evicts the least recently used entries."""
+    key = tile_key(lat, lon)
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO features (tile_key, version, data, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, version, json.dumps(features), now, now),
+            )
+            # Entries from an older source version can never be hit again
+            conn.execute("DELETE FROM features WHERE version != ?", (version,))
+            overflow = conn.execute("SELECT COUNT(*) FROM features").fetchone()[0] - FEATURE_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM features WHERE tile_key IN "
+                    "(SELECT tile_key FROM features ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                _count("evictions", overflow)
+        _count("stores")
+    except sqlite3.Error as e:
+        print(f"Feature cache write failed for ({lat}, {lon}): {e}")
+
+
+def get_or_compute_features(lat, lon, source_paths, compute):
+    """
+    Returns the static features for a point from the cache, computing and
+    storing them on a miss.
+
+    Args:
+        lat (float): Latitude of the point.
+        lon (float): Longitude of the point.
+        source_paths (list[str]): GPKG/TIF files the features are derived from.
+        compute (callable): Called with no arguments to compute the feature dict on a miss.
+
+    Returns:
+        dict: The feature dict ('road', 'industrial', 'population', 'elev').
+    """
+    version = get_source_version(*source_paths)
+    features = get_cached_features(lat, lon, version)
+    if features is not None:
+        return features
+
+    features = compute()
+    # Don't persist results that contain a failed lookup (e.g. elevation API down)
+    if features and all(value is not None for value in features.values()):
+        store_features(lat, lon, version, features)
+    return features
@@ -0,0 +1,90 @@
+import os
+import threading
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+# Rasters up to this many pixels are decoded into memory once; larger ones stay
+# open and are read in small windows around the requested points.
+MAX_IN_MEMORY_PIXELS = int(os.environ.get("RASTER_MAX_IN_MEMORY_PIXELS", str(64_000_000)))
+
+_samplers = {}  # (path, mtime) -> RasterSampler
+_samplers_lock = threading.Lock()
+
+
+class RasterSampler:
+    """
+    Samples a single-band GeoTIFF in EPSG:4326 at many lat/lon points at once.
+
+    The dataset is opened once per process. Small rasters are decoded into a
+    numpy array up front; large ones keep the dataset open and read only the
+    pixels that are asked for (rasterio handles are not thread-safe, so those
+    reads are serialized).
+    """
+
+    def __init__(self, path, band=1):
+        self.path = path
+        self.band = band
+        self._lock = threading.Lock()
+        self._src = rasterio.open(path)
+        self.transform = self._src.transform
+        self.nodata = self._src.nodata
+        self.height = self._src.height
+        self.width = self._src.width
+
+        self.data = None
+        if self.height * self.width <= MAX_IN_MEMORY_PIXELS:
+            self.data = self._src.read(band)
+            self._src.close()
+            self._src = None
+
+    def sample(self, lats, lons):
+        """
+        Returns the raster value at each point as float64.
+        Points outside the raster and nodata pixels come back as NaN.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+
+        # Same pixel as rasterio's dataset.index(): floor of the inverse transform
+        cols, rows = ~self.transform * (lons, lats)
+        rows = np.floor(rows).astype(np.int64)
+        cols = np.floor(cols).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+
+        values = np.full(lats.shape, np.nan)
+        if self.data is not None:
+            values[inside] = self.data[rows[inside], cols[inside]]
+        else:
+            with self._lock:
+                for k in np.flatnonzero(inside):
+                    window = Window(int(cols[k]), int(rows[k]), 1, 1)
+                    values[k] = self._src.read(self.band, window=window)[0, 0]
+
+        if self.nodata is not None and not np.isnan(self.nodata):
+            values[values == self.nodata] = np.nan
+        return values
+
+
+def get_raster_sampler(path):
+    """Returns the process-wide sampler for a raster, reopening it if the file changed."""
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    sampler = _samplers.get(key)
+    if sampler is None:
+        with _samplers_lock:
+            sampler = _samplers.get(key)
+            if sampler is None:
+                sampler = RasterSampler(path)
+                for old_key in [k for k in _samplers if k[0] == key[0]]:
+                    del _samplers[old_key]
+                _samplers[key] = sampler
+    return sampler
+
+
+def sample_population(lats, lons, tif_path):
+    """
+    Vectorized population density lookup. Negative values, nodata and points
+    outside the raster become 0.0, like the original `value >= 0` check.
+    """
+    values = get_raster_sampler(tif_path).sample(lats, lons)
+    return np.where(values >= 0, np.round(values, 2), 0.0)
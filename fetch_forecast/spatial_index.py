@@ -0,0 +1,140 @@
+import os
+import threading
+import numpy as np
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+
+# --- Search Settings (same as the original per-request clip) ---
+SEARCH_RADIUS_METERS = 8000
+DEFAULT_DISTANCE_METERS = 12000 # A default large distance if nothing is found
+
+# Cleaned OSM industrial landuse written by MODEL/geolocation_data.py.
+# Refresh it with: python -m MODEL.geolocation_data --industrial-only
+INDUSTRIAL_GPKG_PATH = './precomputed_industrial.gpkg'
+
+# Layers are read from disk once per process, then reprojected and indexed
+# once per UTM zone that is actually queried. Everything stored here is
+# read-only after creation, so request threads can share it.
+_layers = {}        # (path, mtime) -> GeoDataFrame in EPSG:4326
+_trees = {}         # (path, mtime, epsg) -> STRtree of projected geometries
+_transformers = {}  # epsg -> Transformer from EPSG:4326
+_index_lock = threading.Lock()
+
+
+def utm_epsg_for(lat, lon):
+    """
+    Returns the EPSG code of the WGS 84 UTM zone containing a point.
+    This is the zone GeoDataFrame.estimate_utm_crs() resolves to for a single point.
+    """
+    zone = min(max(int((lon + 180) // 6) + 1, 1), 60)
+    return (32600 if lat >= 0 else 32700) + zone
+
+
+def _layer_key(path):
+    """Keys cached layers on path and modification time so a rebuilt file is picked up."""
+    return (os.path.abspath(path), os.path.getmtime(path))
+
+
+def _load_layer(path, key):
+    """Reads a vector layer once and keeps only its valid geometries in EPSG:4326."""
+    gdf = _layers.get(key)
+    if gdf is None:
+        print(f"Loading spatial layer '{path}'...")
+        gdf = gpd.read_file(path)
+        gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+        gdf = gdf.to_crs("EPSG:4326") if gdf.crs is not None else gdf.set_crs("EPSG:4326")
+        # Drop layers cached for an older version of the same file
+        for old_key in [k for k in _layers if k[0] == key[0]]:
+            del _layers[old_key]
+        _layers[key] = gdf
+    return gdf
+
+
+def _get_tree(path, epsg):
+    """Returns the STRtree for a layer projected to the given UTM zone, building it once."""
+    key = _layer_key(path)
+    tree_key = key + (epsg,)
+    tree = _trees.get(tree_key)
+    if tree is None:
+        with _index_lock:
+            tree = _trees.get(tree_key)
+            if tree is None:
+                gdf = _load_layer(path, key)
+                projected = gdf.geometry.to_crs(epsg=epsg)
+                tree = shapely.STRtree(np.asarray(projected.values))
+                for old_key in [k for k in _trees if k[0] == key[0] and k[1] != key[1]]:
+                    del _trees[old_key]
+                _trees[tree_key] = tree
+    return tree
+
+
+def _get_transformer(epsg):
+    """Returns a cached lon/lat -> UTM transformer."""
+    transformer = _transformers.get(epsg)
+    if transformer is None:
+        transformer = Transformer.from_crs("EPSG:4326", f"EPSG:{epsg}", always_xy=True)
+        _transformers[epsg] = transformer
+    return transformer
+
+
+def nearest_distances(layer_path, lats, lons, search_radius=SEARCH_RADIUS_METERS, default_distance=DEFAULT_DISTANCE_METERS):
+    """
+    Computes the distance in meters from each point to the nearest feature of a layer.
+
+    Distances are measured in each point's UTM zone. Points with no feature
+    within search_radius get default_distance.
+
+    Args:
+        layer_path (str): Path to the vector layer (e.g. a GPKG file).
+        lats (array-like): Latitudes of the points.
+        lons (array-like): Longitudes of the points.
+        search_radius (float): Maximum search distance in meters.
+        default_distance (float): Distance used when nothing is found.
+
+    Returns:
+        np.ndarray: One distance per input point.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    distances = np.full(lats.shape, float(default_distance))
+
+    epsgs = np.array([utm_epsg_for(lat, lon) for lat, lon in zip(lats, lons)])
+    for epsg in np.unique(epsgs):
+        in_zone = np.flatnonzero(epsgs == epsg)
+        tree = _get_tree(layer_path, int(epsg))
+        xs, ys = _get_transformer(int(epsg)).transform(lons[in_zone], lats[in_zone])
+        points = shapely.points(xs, ys)
+
+        (point_idx, _), found = tree.query_nearest(
+            points, max_distance=search_radius, return_distance=True, all_matches=False
+        )
+        distances[in_zone[point_idx]] = found
+
+    return distances
+
+
+def get_distance_to_road(lat, lon, road_gpkg_path):
+    """Returns the distance in meters from a point to the nearest road, rounded like the forecast features."""
+    distance = nearest_distances(road_gpkg_path, [lat], [lon])[0]
+    if distance == DEFAULT_DISTANCE_METERS:
+        print(f"No roads from GPKG file found within {SEARCH_RADIUS_METERS}m. Using default distance.")
+    return round(float(distance), 2)
+
+
+def get_distances_to_road(lats, lons, road_gpkg_path):
+    """Vectorized version of get_distance_to_road for arrays of points."""
+    return np.round(nearest_distances(road_gpkg_path, lats, lons), 2)
+
+
+def get_distance_to_industrial(lat, lon, industrial_gpkg_path=INDUSTRIAL_GPKG_PATH):
+    """Returns the distance in meters from a point to the nearest industrial zone in the local layer."""
+    distance = nearest_distances(industrial_gpkg_path, [lat], [lon])[0]
+    if distance == DEFAULT_DISTANCE_METERS:
+        print(f"No industrial zones found within {SEARCH_RADIUS_METERS}m. Using default distance.")
+    return round(float(distance), 2)
+
+
+def get_distances_to_industrial(lats, lons, industrial_gpkg_path=INDUSTRIAL_GPKG_PATH):
+    """Vectorized version of get_distance_to_industrial for arrays of points."""
+    return np.round(nearest_distances(industrial_gpkg_path, lats, lons), 2)
@@ -0,0 +1,182 @@
+import os
+import json
+import argparse
+import threading
+import numpy as np
+from fetch_forecast.spatial_index import (
+    get_distances_to_road, get_distances_to_industrial, INDUSTRIAL_GPKG_PATH
+)
+from fetch_forecast.raster_sampler import sample_population
+from fetch_forecast.elevation import get_elevations
+
+# --- Grid Configuration ---
+# The TEMPO domain used by MODEL/geolocation_data.py
+NORTH, SOUTH, EAST, WEST = 55, 19, -46, -136
+DEFAULT_RESOLUTION_DEG = 0.02
+STATIC_GRID_PATH = os.environ.get("STATIC_GRID_PATH", "./fetch_forecast/static_grid.npy")
+# Opt-in: bilinear estimates of road/industrial distance drift from the exact
+# distances near roads, which shifts the model inputs there
+STATIC_GRID_INTERPOLATE = os.environ.get("STATIC_GRID_INTERPOLATE", "0") == "1"
+
+# Order of the feature planes in the grid array
+GRID_FEATURES = ('road', 'industrial', 'population', 'elev')
+
+_grid_cache = {}  # path -> (mtime, array, meta)
+_grid_lock = threading.Lock()
+
+
+def _meta_path(grid_path):
+    return os.path.splitext(grid_path)[0] + ".json"
+
+
+# --- Offline Build ---
+
+def build_static_grid(tif_path, road_gpkg_path, industrial_gpkg_path=INDUSTRIAL_GPKG_PATH,
+                      north=NORTH, south=SOUTH, east=EAST, west=WEST,
+                      resolution=DEFAULT_RESOLUTION_DEG, grid_path=STATIC_GRID_PATH,
+                      include_elevation=False):
+    """
+    Evaluates the static forecast features on a regular lat/lon grid and saves
+    them as a memory-mappable float32 array of shape (len(GRID_FEATURES), n_lat, n_lon).
+
+    Grid nodes sit at south + i * resolution and west + j * resolution.
+    Features that could not be computed are stored as NaN, and lookups that
+    touch them fall back to the per-point path.
+
+    Args:
+        tif_path (str): Path to the population GeoTIFF.
+        road_gpkg_path (str): Path to the roads GeoPackage.
+        industrial_gpkg_path (str): Path to the industrial GeoPackage.
+        north, south, east, west (float): Grid bounds in degrees.
+        resolution (float): Grid spacing in degrees.
+        grid_path (str): Output .npy path; metadata is written next to it as .json.
+        include_elevation (bool): Query Open-Meteo for nodes the local DEM cannot answer
+                                  (slow, network bound).
+    """
+    lats = south + resolution * np.arange(int(round((north - south) / resolution)) + 1)
+    lons = west + resolution * np.arange(int(round((east - west) / resolution)) + 1)
+    print(f"Building static feature grid: {len(lats)} x {len(lons)} nodes at {resolution}°...")
+
+    tmp_path = grid_path + ".tmp.npy"
+    grid = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(len(GRID_FEATURES), len(lats), len(lons))
+    )
+    grid[:] = np.nan
+
+    has_industrial = os.path.exists(industrial_gpkg_path)
+    if not has_industrial:
+        print(f"Warning: Industrial layer not found at '{industrial_gpkg_path}'. Industrial plane left as NaN.")
+
+    # Process one latitude row at a time to keep memory flat
+    for i, lat in enumerate(lats):
+        row_lats = np.full(len(lons), lat)
+        grid[0, i] = get_distances_to_road(row_lats, lons, road_gpkg_path)
+        if has_industrial:
+            grid[1, i] = get_distances_to_industrial(row_lats, lons, industrial_gpkg_path)
+        grid[2, i] = sample_population(row_lats, lons, tif_path)
+
+        grid[3, i] = get_elevations(row_lats, lons, allow_fallback=include_elevation)
+
+        if i % 50 == 0:
+            print(f"  - Row {i + 1}/{len(lats)} done")
+
+    grid.flush()
+    del grid
+
+    meta = {
+        "features": list(GRID_FEATURES),
+        "south": south,
+        "west": west,
+        "resolution": resolution,
+        "n_lat": len(lats),
+        "n_lon": len(lons),
+    }
+    meta_tmp = _meta_path(grid_path) + ".tmp"
+    with open(meta_tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+
+    # Swap both files into place so the app never sees a partial grid
+    os.replace(tmp_path, grid_path)
+    os.replace(meta_tmp, _meta_path(grid_path))
+    print(f"✅ Static feature grid saved to {grid_path}")
+
+
+# --- Request-time Lookup ---
+
+def _load_grid(grid_path):
+    """Memory-maps the grid once per file version."""
+    if not os.path.exists(grid_path) or not os.path.exists(_meta_path(grid_path)):
+        return None, None
+    mtime = os.path.getmtime(grid_path)
+    cached = _grid_cache.get(grid_path)
+    if cached is None or cached[0] != mtime:
+        with _grid_lock:
+            cached = _grid_cache.get(grid_path)
+            if cached is None or cached[0] != mtime:
+                with open(_meta_path(grid_path)) as f:
+                    meta = json.load(f)
+                cached = (mtime, np.load(grid_path, mmap_mode="r"), meta)
+                _grid_cache[grid_path] = cached
+    return cached[1], cached[2]
+
+
+def lookup_static_features(lat, lon, grid_path=STATIC_GRID_PATH, interpolate=STATIC_GRID_INTERPOLATE):
+    """
+    Reads the static features for a point from the precomputed grid.
+
+    Args:
+        lat (float): Latitude of the point.
+        lon (float): Longitude of the point.
+        grid_path (str): Path to the grid built by build_static_grid.
+        interpolate (bool): Bilinear interpolation between the four surrounding
+                            nodes instead of taking the nearest node.
+
+    Returns:
+        dict | None: The feature dict (a feature is None where the grid has no
+                     value), or None if there is no grid or the point is outside it.
+    """
+    grid, meta = _load_grid(grid_path)
+    if grid is None:
+        return None
+
+    # Fractional index of the point in the grid
+    fi = (lat - meta["south"]) / meta["resolution"]
+    fj = (lon - meta["west"]) / meta["resolution"]
+    if not (0 <= fi <= meta["n_lat"] - 1 and 0 <= fj <= meta["n_lon"] - 1):
+        return None
+
+    if interpolate:
+        i0 = min(int(fi), meta["n_lat"] - 2) if meta["n_lat"] > 1 else 0
+        j0 = min(int(fj), meta["n_lon"] - 2) if meta["n_lon"] > 1 else 0
+        di, dj = fi - i0, fj - j0
+        cell = np.asarray(grid[:, i0:i0 + 2, j0:j0 + 2], dtype=float)
+        weights = np.array([[(1 - di) * (1 - dj), (1 - di) * dj],
+                            [di * (1 - dj), di * dj]])[:cell.shape[1], :cell.shape[2]]
+        values = (cell * weights).sum(axis=(1, 2))
+    else:
+        values = np.asarray(grid[:, int(round(fi)), int(round(fj))], dtype=float)
+
+    if not np.any(np.isfinite(values)):
+        return None
+    return {
+        name: round(float(value), 2) if np.isfinite(value) else None
+        for name, value in zip(meta["features"], values)
+    }
+
+
+if __name__ == "__main__":
+    # Example: python -m fetch_forecast.static_grid --resolution 0.02 --with-elevation
+    arg_parser = argparse.ArgumentParser(description="Precompute the static forecast feature grid.")
+    arg_parser.add_argument("--resolution", type=float, default=DEFAULT_RESOLUTION_DEG)
+    arg_parser.add_argument("--bbox", type=float, nargs=4, metavar=("NORTH", "SOUTH", "EAST", "WEST"),
+                            default=(NORTH, SOUTH, EAST, WEST))
+    arg_parser.add_argument("--tif-path", default="./MODEL/pm25.tif")
+    arg_parser.add_argument("--road-gpkg-path", default="./MODEL/pm25.gpkg")
+    arg_parser.add_argument("--industrial-gpkg-path", default=INDUSTRIAL_GPKG_PATH)
+    arg_parser.add_argument("--output", default=STATIC_GRID_PATH)
+    arg_parser.add_argument("--with-elevation", action="store_true")
+    args = arg_parser.parse_args()
+
+    north, south, east, west = args.bbox
+    build_static_grid(args.tif_path, args.road_gpkg_path, args.industrial_gpkg_path,
+                      north, south, east, west, args.resolution, args.output, args.with_elevation)
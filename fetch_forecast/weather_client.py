@@ -0,0 +1,152 @@
+import os
+import math
+import time
+import threading
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- Client Configuration ---
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("WEATHER_TIMEOUT_SECONDS", "10"))
+# Forecasts are shared by every location in the same tile (0.05° is about 5 km,
+# finer than the weather models behind Open-Meteo).
+WEATHER_CACHE_TILE_DEG = float(os.environ.get("WEATHER_CACHE_TILE_DEG", "0.05"))
+# Open-Meteo refreshes its models hourly; cached entries expire at the next boundary.
+WEATHER_UPDATE_INTERVAL_SECONDS = int(os.environ.get("WEATHER_UPDATE_INTERVAL_SECONDS", "3600"))
+
+_cache = {}      # tile -> (expires_at, forecast dict)
+_inflight = {}   # tile -> Future of the upstream call currently running for it
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "upstream_calls": 0, "collapsed": 0}
+
+# One pooled session for the whole process
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), allowed_methods=("GET",))
+))
+
+
+def _tile(latitude, longitude):
+    """Quantizes a coordinate to its cache tile and returns (key, tile-center lat, lon)."""
+    i = math.floor(latitude / WEATHER_CACHE_TILE_DEG)
+    j = math.floor(longitude / WEATHER_CACHE_TILE_DEG)
+    center_lat = round((i + 0.5) * WEATHER_CACHE_TILE_DEG, 4)
+    center_lon = round((j + 0.5) * WEATHER_CACHE_TILE_DEG, 4)
+    return (i, j), center_lat, center_lon
+
+
+def _next_update_time(now):
+    """Returns the epoch time of the next model update boundary."""
+    return (math.floor(now / WEATHER_UPDATE_INTERVAL_SECONDS) + 1) * WEATHER_UPDATE_INTERVAL_SECONDS
+
+
+def _fetch_forecast(latitude, longitude):
+    """
+    Retrieves a 7-day weather forecast from Open-Meteo.
+    Returns a Python dictionary, not a JSON string.
+    """
+    print("Fetching 7-day weather forecast...")
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": "temperature_2m_mean,relative_humidity_2m_mean,precipitation_sum",
+        "timezone": "auto",
+        "forecast_days": 7
+    }
+    try:
+        response = _session.get(FORECAST_URL, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        data = response.json()
+        forecast_data = {}
+        daily_data = data.get("daily", {})
+
+        dates = daily_data.get("time", [])
+        temps = daily_data.get("temperature_2m_mean", [])
+        humidity = daily_data.get("relative_humidity_2m_mean", [])
+        precip_sum = daily_data.get("precipitation_sum", [])
+
+        for i, date_str in enumerate(dates):
+            try:
+                avg_precip_mm_hr = precip_sum[i] / 24.0
+                forecast_data[date_str] = {
+                    "temp": round(temps[i], 2),
+                    "rh": round(humidity[i], 2),
+                    "prectot": round(avg_precip_mm_hr, 4)
+                }
+            except IndexError:
+                print(f"Warning: Missing weather data for date {date_str}. Skipping this day.")
+
+        return forecast_data
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data from weather API: {e}")
+        return None
+    except KeyError:
+        print("Error: Unexpected data format received from the weather API.")
+        return None
+
+
+def _drop_expired(now):
+    """Drops expired entries so the cache does not grow without bound. Caller holds _lock."""
+    for key in [k for k, (expires_at, _) in _cache.items() if expires_at <= now]:
+        del _cache[key]
+
+
+def get_daily_forecast(latitude, longitude):
+    """
+    Returns the 7-day daily forecast for a location, served from the tile cache
+    when possible. Concurrent requests for the same tile share one upstream call.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+
+    Returns:
+        dict | None: Date -> {'temp', 'rh', 'prectot'}, or None if the API failed.
+    """
+    key, center_lat, center_lon = _tile(latitude, longitude)
+    now = time.time()
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > now:
+            _stats["hits"] += 1
+            return {date: dict(values) for date, values in cached[1].items()}
+
+        _stats["misses"] += 1
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+            _stats["upstream_calls"] += 1
+        else:
+            _stats["collapsed"] += 1
+
+    if is_leader:
+        forecast = None
+        try:
+            forecast = _fetch_forecast(center_lat, center_lon)
+        finally:
+            with _lock:
+                _drop_expired(time.time())
+                if forecast:
+                    _cache[key] = (_next_update_time(time.time()), forecast)
+                del _inflight[key]
+            future.set_result(forecast)
+    else:
+        forecast = future.result()
+
+    if not forecast:
+        return None
+    return {date: dict(values) for date, values in forecast.items()}
+
+
+def get_weather_stats():
+    """Returns cache and upstream call counters for this process."""
+    with _lock:
+        stats = dict(_stats)
+        stats["cached_tiles"] = len(_cache)
+    return stats